@@ -0,0 +1,133 @@
+"""
+Async versions of the read-heavy views, served when ASYNC_READ_VIEWS is on
+(the default for the ASGI entry point, see rental_app/asgi.py).
+
+Each view subclasses its sync counterpart, so querysets, filters, permissions,
+serializers and response caching are shared; only the request lifecycle and
+the queries themselves run asynchronously, through Django's async ORM.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+from .buffers import search_history_buffer, visit_buffer
+from .views import EstateListView, EstateDetailView, SearchHistoryView, VisitorsView
+
+
+class AsyncAPIViewMixin:
+    """
+    Async request lifecycle for DRF generic views.
+
+    Mirrors ``APIView.dispatch()``, except that authentication and the handler
+    are awaited. JSON responses are rendered in place, which avoids handing
+    them to a worker thread for rendering. List views get ``alist()`` from
+    ValuesListMixin (see api.fastpath).
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if getattr(request, 'accepted_renderer', None) is not None and request.accepted_renderer.format == 'json':
+            if hasattr(self.response, 'render'):
+                self.response.render()
+        return self.response
+
+    async def aperform_authentication(self, request):
+        # Authenticate up front so that initial() finds request.user already set
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return self.get_response(serializer.data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get_response(self, data):
+        return Response(data)
+
+
+class AsyncEstateListView(AsyncAPIViewMixin, EstateListView):
+    async def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            await search_history_buffer.aput(self.get_search_record(request))
+        # The response cache is read synchronously: a local file read is
+        # cheaper than a hop to a worker thread
+        response = self.get_cached_response(request)
+        if response is not None:
+            return response
+        return await self.alist(request, *args, **kwargs)
+
+
+class AsyncEstateDetailView(AsyncAPIViewMixin, EstateDetailView):
+    async def get(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is None:
+            response = await self.aretrieve(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            await visit_buffer.aput(self.get_visit_record(request))
+        return response
+
+
+class AsyncSearchHistoryView(AsyncAPIViewMixin, SearchHistoryView):
+    async def get(self, request, *args, **kwargs):
+        format = self.get_export_format()
+        if format is not None:
+            return self.export(format, asynchronous=True)
+        return await self.alist(request, *args, **kwargs)
+
+
+class AsyncVisitorsView(AsyncAPIViewMixin, VisitorsView):
+    async def get(self, request, *args, **kwargs):
+        format = self.get_export_format()
+        if format is not None:
+            return self.export(format, asynchronous=True)
+        return await self.alist(request, *args, **kwargs)
@@ -0,0 +1,209 @@
+"""
+Stateless JWT authentication.
+
+Access tokens issued by LoginUserView carry the claims the views need
+(``role`` and ``username``), so requests are authenticated from the token
+alone. Older tokens without them are authenticated by ``get_cached_user()``,
+which keeps the few fields a ClaimsUser needs (not the row, whose password
+hash has no place in a shared cache) for ``AUTH_USER_CACHE_TIMEOUT`` seconds.
+
+Tokens are revoked per user with ``revoke_user_tokens()``: tokens issued before
+that moment are rejected from then on. The moment is stored on the user row
+(``CustomUser.tokens_revoked_at``) and only copied to the cache, so that a
+revocation holds even when the cache evicts or loses the copy; a miss costs
+one query on the primary. It is compared with the ``issued_at`` claim, which
+unlike ``iat`` keeps fractions of a second, so that a login right after a
+revocation is not rejected with the tokens it replaces. Deactivating, deleting
+a user or changing their role or password does this automatically (see
+api.signals).
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import metrics
+from .models import CustomUser
+
+# Fields of the user kept in the cache for tokens without claims
+CACHED_USER_FIELDS = ('id', 'username', 'role', 'is_active')
+
+
+def _user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _revoked_cache_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def _get_cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def _primary_users():
+    # Replicas may not have the latest revocation yet
+    return CustomUser.objects.db_manager(router.db_for_write(CustomUser))
+
+
+def get_cached_user(user_id):
+    """
+    Return a ClaimsUser for the active user with the given id, or raise
+    AuthenticationFailed.
+    """
+    key = _user_cache_key(user_id)
+    fields = cache.get(key)
+    if fields is None:
+        fields = _primary_users().filter(pk=user_id).values(*CACHED_USER_FIELDS).first()
+        if fields is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        cache.set(key, fields, _get_cache_timeout())
+    if not fields['is_active']:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return ClaimsUser({
+        api_settings.USER_ID_CLAIM: fields['id'], 'username': fields['username'], 'role': fields['role'],
+    })
+
+
+def forget_cached_user(user_id):
+    cache.delete(_user_cache_key(user_id))
+
+
+def get_tokens_revoked_at(user_id, cached_only=False):
+    """
+    Return the time, as a timestamp, before which the user's tokens are
+    revoked: 0 if they never were, infinity if the user no longer exists.
+    With ``cached_only``, return None instead of querying on a cache miss.
+    """
+    key = _revoked_cache_key(user_id)
+    revoked_at = cache.get(key)
+    if revoked_at is None and not cached_only:
+        rows = list(_primary_users().filter(pk=user_id).values_list('tokens_revoked_at', flat=True))
+        if not rows:
+            revoked_at = math.inf
+        else:
+            revoked_at = rows[0].timestamp() if rows[0] is not None else 0.0
+        cache.set(key, revoked_at, _get_cache_timeout())
+    return revoked_at
+
+
+def revoke_user_tokens(user_id):
+    """
+    Reject every token issued to the user so far.
+    """
+    now = timezone.now()
+    _primary_users().filter(pk=user_id).update(tokens_revoked_at=now)
+    cache.set(_revoked_cache_key(user_id), now.timestamp(), _get_cache_timeout())
+    forget_cached_user(user_id)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token whose claims, copied to its access tokens, describe the user.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['issued_at'] = token.current_time.timestamp()
+        token['role'] = user.role
+        token['username'] = user.username
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lightweight user built from the claims of a validated access token.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    def get_full_user(self):
+        return CustomUser.objects.get(pk=self.id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not query the user table for tokens carrying
+    a ``role`` claim. Older tokens fall back to the cached user fields.
+    """
+
+    def authenticate(self, request):
+        with metrics.phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            user = get_cached_user(validated_token[api_settings.USER_ID_CLAIM])
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        ``authenticate()`` for async views: only tokens without a role claim
+        need the database, and those load the user in a worker thread.
+        """
+        with metrics.phase('auth'):
+            return await self._aauthenticate(request)
+
+    async def _aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user_id = self.get_user_id(validated_token)
+        revoked_at = get_tokens_revoked_at(user_id, cached_only=True)
+        if revoked_at is None:
+            revoked_at = await sync_to_async(get_tokens_revoked_at)(user_id)
+        user = self.get_claims_user(validated_token, revoked_at)
+        if user is None:
+            user = await sync_to_async(get_cached_user)(validated_token[api_settings.USER_ID_CLAIM])
+        return user, validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+    def get_claims_user(self, validated_token, revoked_at=None):
+        """
+        Return a ClaimsUser for tokens carrying a role claim, None for older
+        tokens. ``revoked_at`` is looked up when not given.
+        """
+        user_id = self.get_user_id(validated_token)
+        if revoked_at is None:
+            revoked_at = get_tokens_revoked_at(user_id)
+        issued_at = validated_token.get('issued_at')
+        if issued_at is None:
+            # Older tokens only have iat, in whole seconds
+            revoked = revoked_at and validated_token.get('iat', 0) <= revoked_at
+        else:
+            revoked = issued_at < revoked_at
+        if revoked:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        if 'role' in validated_token:
+            return ClaimsUser(validated_token)
+        return None
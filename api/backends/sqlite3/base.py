@@ -0,0 +1,133 @@
+"""
+SQLite backend that serializes writers (see SQLITE_PRODUCTION in settings).
+
+SQLite lets one connection write at a time. A writer that finds the database
+locked waits in SQLite's busy handler, which polls with sleeps growing to
+100 ms: under contention the lock sits idle between a commit and the next
+waiter's wake-up, and waiters give up with "database is locked" once the
+timeout runs out. Here writers instead queue on an exclusive lock on a file
+next to the database, taken before the write starts and released when it
+ends, so the next writer starts as soon as the lock is free and never meets
+a locked database. Readers take no lock; with WAL journaling they are not
+blocked by the writer either.
+
+Writes are the transactions started by ``transaction.atomic()`` (BEGIN
+IMMEDIATE with the ``transaction_mode`` option) and writing statements run
+in autocommit mode. Without ``fcntl`` (Windows) writers are not serialized.
+"""
+from django.db.backends.sqlite3 import base
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class WriterLock:
+    """
+    Exclusive lock on a file shared by every connection to one database,
+    in any thread or process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.held = False
+
+    def acquire(self):
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def close(self):
+        self.release()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    writer_lock = None
+
+    def execute(self, query, params=None):
+        if not self.needs_writer_lock(query):
+            return super().execute(query, params)
+        with self.writer_lock:
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        if not self.needs_writer_lock(query):
+            return super().executemany(query, param_list)
+        with self.writer_lock:
+            return super().executemany(query, param_list)
+
+    def needs_writer_lock(self, query):
+        # Statements in a transaction run under the transaction's lock
+        return (
+            self.writer_lock is not None
+            and not self.connection.in_transaction
+            and query.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS)
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    writer_lock = None
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if fcntl is not None and not self.is_in_memory_db():
+            self.writer_lock = WriterLock(f'{self.settings_dict["NAME"]}-writer.lock')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.writer_lock = self.writer_lock
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if self.writer_lock is None:
+            return super()._start_transaction_under_autocommit()
+        self.writer_lock.acquire()
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self.writer_lock.release()
+            raise
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_writer_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_writer_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            if self.writer_lock is not None:
+                self.writer_lock.close()
+                self.writer_lock = None
+
+    def _release_writer_lock(self):
+        if self.writer_lock is not None:
+            self.writer_lock.release()
@@ -0,0 +1,146 @@
+"""
+Write-behind buffers for records that are written on hot read paths
+(search history on the estate list, visits on the estate detail).
+
+Records are queued in process memory and written by a background thread with
+``bulk_create`` once ``BATCH_SIZE`` records are waiting or ``FLUSH_INTERVAL``
+seconds have passed, and once more when the process exits.
+
+Loss policy: buffered records are best-effort analytics, not business data.
+- When the queue holds ``MAX_SIZE`` records, new records are dropped (and
+  counted in ``dropped``) instead of blocking the request.
+- A batch that fails to write is logged and discarded, not retried.
+- Records still queued when the process is killed without a normal exit
+  (SIGKILL, OOM, crash) are lost; at most one queue's worth per process.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .history import record_searches
+from .models import Visit
+from .rollups import apply_visits
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+
+def get_buffer_setting(name):
+    return getattr(settings, 'WRITE_BEHIND_BUFFER', {}).get(name, DEFAULTS[name])
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of records flushed in batches by ``write_batch``.
+    """
+
+    def __init__(self, name, write_batch):
+        self.name = name
+        self.write_batch = write_batch
+        self.dropped = 0
+        self._queue = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, record):
+        if not get_buffer_setting('ENABLED'):
+            self.write_batch([record])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning('%s buffer is full, %d records dropped so far', self.name, self.dropped)
+            return
+        if self._queue.qsize() >= get_buffer_setting('BATCH_SIZE'):
+            self._wakeup.set()
+
+    async def aput(self, record):
+        """
+        ``put()`` for async views: only the unbuffered mode touches the database.
+        """
+        if not get_buffer_setting('ENABLED'):
+            await sync_to_async(self.write_batch)([record])
+            return
+        self.put(record)
+
+    def flush(self):
+        """
+        Write everything queued so far in batches of ``BATCH_SIZE``.
+        """
+        if self._queue is None:
+            return
+        batch_size = get_buffer_setting('BATCH_SIZE')
+        while True:
+            batch = []
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.write_batch(batch)
+            except Exception:
+                logger.exception('Failed to write %d buffered %s records', len(batch), self.name)
+
+    def _ensure_started(self):
+        # Start lazily and again after a fork: threads do not survive a fork,
+        # so every worker process needs its own queue and flusher.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=get_buffer_setting('MAX_SIZE'))
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(get_buffer_setting('FLUSH_INTERVAL'))
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+
+def write_search_history(records):
+    # Repeated searches are counted rather than stored again
+    record_searches(records)
+
+
+def write_visits(records):
+    with transaction.atomic():
+        Visit.objects.bulk_create(records)
+        apply_visits(records)
+
+
+search_history_buffer = WriteBehindBuffer('search_history', write_search_history)
+visit_buffer = WriteBehindBuffer('visit', write_visits)
+
+BUFFERS = [search_history_buffer, visit_buffer]
+
+
+@atexit.register
+def flush_all():
+    for buffer in BUFFERS:
+        if buffer._pid == os.getpid():
+            buffer.flush()
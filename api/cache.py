@@ -0,0 +1,128 @@
+"""
+Versioned response cache for the estate read endpoints.
+
+Every cached response is stored under a key that includes the current
+version of the data it was built from: one version for the estate list and
+one per estate. Writes bump the versions (see api.signals), which makes the
+old entries unreachable immediately; they are evicted by the cache backend.
+A version is the time of the last change in microseconds, so it doubles as
+the Last-Modified date, once the second it falls in is over.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .routers import get_pin_seconds, use_primary
+
+LIST_VERSION_KEY = 'estate:list:version'
+# Version of the bookings, for availability-filtered lists (see api.occupancy)
+OCCUPANCY_VERSION_KEY = 'estate:occupancy:version'
+
+
+def estate_version_key(pk):
+    return f'estate:{pk}:version'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Nothing changed since the cache was cleared, but start from now so
+            # that clients holding older validators refetch
+            cache.add(key, _now(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_estate_versions(pks):
+    """
+    Invalidate the cached list and the cached details of the given estates.
+    """
+    now = _now()
+    versions = {estate_version_key(pk): now for pk in pks}
+    versions[LIST_VERSION_KEY] = now
+    cache.set_many(versions, timeout=None)
+
+
+def bump_occupancy_version():
+    """
+    Invalidate the cached lists filtered by availability.
+    """
+    cache.set(OCCUPANCY_VERSION_KEY, _now(), timeout=None)
+
+
+class CachedResponseMixin:
+    """
+    Serve GET requests rendered as JSON from the cache, with ETag and
+    Last-Modified validators and 304 answers to conditional requests.
+
+    Views list the version keys their response depends on in
+    ``get_cache_version_keys()``.
+    """
+    cache_timeout = None
+    cache_key = None
+    cache_miss = False
+
+    def get_cache_version_keys(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is not None:
+            return response
+        return super().get(request, *args, **kwargs)
+
+    def get_cached_response(self, request):
+        """
+        Return a 304 or a cached response, or None if the view must build the
+        response, which is then cached by ``finalize_response()``.
+        """
+        if request.accepted_renderer.format != 'json':
+            return None
+
+        versions = get_versions(self.get_cache_version_keys())
+        # With the scheme and host, which the next and previous links contain
+        digest = hashlib.md5(f'{request.build_absolute_uri()}:{versions}'.encode()).hexdigest()
+        self.cache_key = f'response:{digest}'
+        self.etag = f'"{digest}"'
+        self.last_modified = max(versions) // 1_000_000
+        if _now() // 1_000_000 <= self.last_modified:
+            # A change later in this second would get the same date, and be
+            # answered 304 to If-Modified-Since: the ETag alone validates
+            self.last_modified = None
+
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+        if response is not None:
+            return response
+        cached = cache.get(self.cache_key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        self.cache_miss = True
+        if _now() - max(versions) < get_pin_seconds() * 1_000_000:
+            # A lagging replica could hand out the old data, which would then
+            # be cached under the new version
+            use_primary()
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.cache_key is None or response.status_code not in (200, 304):
+            return response
+        if self.cache_miss and response.status_code == 200:
+            response.render()
+            timeout = self.cache_timeout or getattr(settings, 'ESTATE_CACHE_TIMEOUT', 300)
+            cache.set(self.cache_key, (response.content, response['Content-Type']), timeout)
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        return response
@@ -0,0 +1,30 @@
+"""
+The drf-spectacular annotations used by the views, or stand-ins that do
+nothing when the API docs are turned off (``API_DOCS['ENABLED']``), so that
+workers of such a deployment never import drf-spectacular.
+"""
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SCHEMA_DIR': None,
+}
+
+
+def get_docs_setting(name):
+    return getattr(settings, 'API_DOCS', {}).get(name, DEFAULTS[name])
+
+
+if get_docs_setting('ENABLED'):
+    from drf_spectacular.types import OpenApiTypes
+    from drf_spectacular.utils import extend_schema
+else:
+    class _OpenApiTypes:
+        # Stands in for the members passed to extend_schema()
+        def __getattr__(self, name):
+            return None
+
+    OpenApiTypes = _OpenApiTypes()
+
+    def extend_schema(*args, **kwargs):
+        return lambda view: view
@@ -0,0 +1,146 @@
+"""
+Fast read path for the list endpoints.
+
+A ModelSerializer builds every row through per-field attribute lookups and
+``to_representation()`` calls on model instances. For list pages the rows
+are instead fetched with ``values_list()``, only the serialized columns, and
+turned into dicts by a field mapping compiled once per serializer class:
+columns whose database value already is the representation (integers,
+strings, booleans, related primary keys) are copied as they are, and only
+the others are converted, as their field's ``to_representation()`` does.
+The output is the serializer's, key for key.
+
+Only plain model fields and primary key related fields are supported; a
+serializer that overrides ``to_representation()`` must produce what its
+fields do (see EstateSerializer).
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import ISO_8601
+from rest_framework import fields as drf_fields
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Field types whose representation of a database value is the value itself
+_IDENTITY_FIELDS = (drf_fields.IntegerField, drf_fields.CharField, drf_fields.BooleanField)
+
+
+def _float_converter(field):
+    return float
+
+
+def _datetime_converter(field):
+    # DateTimeField.to_representation() looks the current time zone up for
+    # every value; look it up once per list instead
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601 or hasattr(field, 'timezone'):
+        return field.to_representation
+    field_timezone = field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+# Functions returning the converter of a field when a list is represented
+_CONVERTERS = {
+    drf_fields.FloatField: _float_converter,
+    drf_fields.DateTimeField: _datetime_converter,
+}
+
+_representations = {}
+
+
+class ValuesRepresentation:
+    """
+    Field mapping of a ModelSerializer: the columns to fetch and how each one
+    is represented.
+    """
+
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.keys, self.columns, self.converters = [], [], []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if len(field.source_attrs) != 1:
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{field.field_name}: only model fields are supported.'
+                )
+            model_field = model._meta.get_field(field.source_attrs[0])
+            if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+                # The related primary key, as PKOnlyObject gives it
+                convert = None
+            elif model_field.is_relation:
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{field.field_name}: only primary key relations are supported.'
+                )
+            elif type(field) in _IDENTITY_FIELDS:
+                convert = None
+            else:
+                convert = _CONVERTERS.get(type(field), lambda field: field.to_representation)
+            if convert is not None:
+                self.converters.append((len(self.columns), field, convert))
+            self.keys.append(field.field_name)
+            self.columns.append(model_field.attname)
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        if serializer_class not in _representations:
+            _representations[serializer_class] = cls(serializer_class)
+        return _representations[serializer_class]
+
+    def get_rows(self, queryset):
+        # Named rows, so that cursor pagination can read the ordering fields
+        return queryset.values_list(*self.columns, named=True)
+
+    def represent(self, rows):
+        keys = self.keys
+        converters = [(index, get_converter(field)) for index, field, get_converter in self.converters]
+        if not converters:
+            return [dict(zip(keys, row)) for row in rows]
+        results = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters:
+                # As in Serializer.to_representation(), None is not converted
+                if row[index] is not None:
+                    row[index] = convert(row[index])
+            results.append(dict(zip(keys, row)))
+        return results
+
+
+class ValuesListMixin:
+    """
+    List views served from ``values_list()`` rows represented with the
+    compiled mapping of the view's serializer class, synchronously or with
+    the async ORM (``alist()``, see api.async_views).
+    """
+
+    def get_values_representation(self):
+        return ValuesRepresentation.for_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        representation = self.get_values_representation()
+        rows = representation.get_rows(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.represent(page))
+        return Response(representation.represent(rows))
+
+    async def alist(self, request, *args, **kwargs):
+        representation = self.get_values_representation()
+        rows = representation.get_rows(self.filter_queryset(self.get_queryset()))
+
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(rows, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(representation.represent(page))
+        return Response(representation.represent([row async for row in rows]))
@@ -0,0 +1,206 @@
+import datetime
+import math
+
+import django_filters
+from django.db.models import F, Q
+from django.db.models.functions import Abs, Least
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from . import geo, occupancy
+from .models import Estate
+from .search import search_estates
+
+# Half the circumference: a circle this wide already covers the globe
+MAX_RADIUS_KM = geo.KM_PER_DEGREE * 180
+
+
+def _valid_point(latitude, longitude):
+    return -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+
+
+def _parse_floats(name, value, count):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(map(math.isfinite, numbers)):
+        raise ValidationError({name: [f'Expected {count} comma-separated numbers.']})
+    return numbers
+
+
+def _parse_period_bound(param, value, dates_only):
+    try:
+        return serializers.DateField().run_validation(value)
+    except serializers.ValidationError as exc:
+        if dates_only:
+            raise ValidationError({param: exc.detail})
+    try:
+        return serializers.DateTimeField().run_validation(value)
+    except serializers.ValidationError as exc:
+        raise ValidationError({param: exc.detail})
+
+
+def filter_period(queryset, query_params, field_name, dates_only=False):
+    """
+    Apply the inclusive ``since`` and ``until`` query parameters, dates or
+    datetimes, to a date or datetime field. For a datetime field, a date
+    covers the whole day.
+    """
+    for param, lookup in (('since', 'gte'), ('until', 'lte')):
+        if param not in query_params:
+            continue
+        bound = _parse_period_bound(param, query_params[param], dates_only)
+        if not dates_only and not isinstance(bound, datetime.datetime):
+            # Compare with the start of the day, or of the next day for until
+            if param == 'until':
+                bound, lookup = bound + datetime.timedelta(days=1), 'lt'
+            bound = timezone.make_aware(datetime.datetime.combine(bound, datetime.time.min))
+        queryset = queryset.filter(**{f'{field_name}__{lookup}': bound})
+    return queryset
+
+
+def filter_choices(queryset, query_params, field_name, choices):
+    """
+    Apply the query parameter named after a choice field: one value, or
+    several separated by commas.
+    """
+    if field_name not in query_params:
+        return queryset
+    values = query_params[field_name].split(',')
+    valid = {value for value, _ in choices}
+    invalid = [value for value in values if value not in valid]
+    if invalid:
+        raise ValidationError({field_name: [f'Invalid value: {value}.' for value in invalid]})
+    return queryset.filter(**{f'{field_name}__in': values})
+
+
+class EstateFilter(django_filters.FilterSet):
+    """
+    Exact filters, price range and geographic search for the estate list.
+
+    Geographic filters first select the grid cells of the area through the
+    geo_cell index and then check the exact coordinates.
+    """
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    bbox = django_filters.CharFilter(
+        method='filter_bbox',
+        help_text='Bounding box as min_lat,min_lng,max_lat,max_lng. '
+                  'A min_lng greater than max_lng crosses the antimeridian.',
+    )
+    near = django_filters.CharFilter(
+        method='filter_near',
+        help_text='Circle as lat,lng,radius_km.',
+    )
+    check_in = django_filters.DateFilter(
+        method='filter_stay',
+        help_text='With check_out: only estates free for a stay from this date.',
+    )
+    check_out = django_filters.DateFilter(
+        method='filter_stay',
+        help_text='With check_in: only estates free for a stay until this date.',
+    )
+
+    class Meta:
+        model = Estate
+        fields = ['title', 'location', 'price', 'is_active']
+
+    def filter_bbox(self, queryset, name, value):
+        min_lat, min_lng, max_lat, max_lng = _parse_floats(name, value, 4)
+        if not _valid_point(min_lat, min_lng) or not _valid_point(max_lat, max_lng):
+            raise ValidationError({name: ['Latitudes must be within [-90, 90] and longitudes within [-180, 180].']})
+        if min_lat > max_lat:
+            raise ValidationError({name: ['min_lat must not be greater than max_lat.']})
+        queryset = self.filter_cells(queryset, min_lat, min_lng, max_lat, max_lng)
+        queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        if min_lng > max_lng:
+            return queryset.filter(Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng))
+        return queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+
+    def filter_near(self, queryset, name, value):
+        latitude, longitude, radius_km = _parse_floats(name, value, 3)
+        if not _valid_point(latitude, longitude) or not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValidationError({name: [
+                f'Latitude must be within [-90, 90], longitude within [-180, 180] and the radius '
+                f'within (0, {MAX_RADIUS_KM:.0f}] km.'
+            ]})
+        queryset = self.filter_cells(queryset, *geo.radius_box(latitude, longitude, radius_km))
+        # Equirectangular distance, accurate to well under a percent at city scale
+        lng_scale = math.cos(math.radians(latitude))
+        dlat = F('latitude') - latitude
+        # The shorter way round, across the antimeridian if need be
+        dlng_abs = Abs(F('longitude') - longitude)
+        dlng = Least(dlng_abs, 360.0 - dlng_abs) * lng_scale
+        return queryset.alias(distance_sq=dlat * dlat + dlng * dlng).filter(
+            distance_sq__lte=(radius_km / geo.KM_PER_DEGREE) ** 2
+        )
+
+    def filter_stay(self, queryset, name, value):
+        # Both dates are applied together by filter_queryset()
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        check_in = self.form.cleaned_data.get('check_in')
+        check_out = self.form.cleaned_data.get('check_out')
+        if check_in is None and check_out is None:
+            return queryset
+        if check_in is None or check_out is None:
+            raise ValidationError({'check_in': ['check_in and check_out must be given together.']})
+        if check_in < timezone.localdate():
+            raise ValidationError({'check_in': ['check_in must not be in the past.']})
+        if not 0 < (check_out - check_in).days <= occupancy.MAX_STAY_DAYS:
+            raise ValidationError(
+                {'check_out': [f'check_out must be 1 to {occupancy.MAX_STAY_DAYS} days after check_in.']}
+            )
+        return occupancy.filter_available(queryset, check_in, check_out)
+
+    def filter_cells(self, queryset, min_lat, min_lng, max_lat, max_lng):
+        condition = Q()
+        for low, high in geo.cover(min_lat, min_lng, max_lat, max_lng):
+            condition |= Q(geo_cell__gte=low, geo_cell__lt=high)
+        return queryset.filter(condition)
+
+
+class EstateSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over title, description and location, ordered by relevance.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_estates(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search in title, description and location. Results are ranked by relevance.',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class EstateOrderingFilter(OrderingFilter):
+    """
+    Ordering by one of the view's ``ordering_fields``, followed by id in the
+    same direction as a tie-breaker, so that the cursor pagination can walk the
+    (field, id) index.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        order = ordering[0]
+        if order.lstrip('-') in ('id', 'pk'):
+            return [order]
+        return [order, '-id' if order.startswith('-') else 'id']
@@ -0,0 +1,99 @@
+"""
+Grid index for estate coordinates.
+
+The globe is split into a 2**26 x 2**26 grid (cells of about 0.6 m) and each
+estate stores the Z-order (Morton) code of its cell in ``Estate.geo_cell``.
+Cells that share a code prefix form a square block, and every block is one
+contiguous range of codes. A bounding box is therefore covered by a few code
+ranges, each answered by a range scan of the geo_cell index.
+This is the integer form of a geohash and needs no spatial extension.
+"""
+import math
+
+CELL_BITS = 26
+KM_PER_DEGREE = 111.32
+
+# A box is covered with at most this many blocks; a coarser level is used
+# when finer blocks would take more, at the cost of scanning a margin
+MAX_COVER_BLOCKS = 64
+
+
+def _quantize(value, low, span):
+    cell = int((value - low) / span * (1 << CELL_BITS))
+    return min(max(cell, 0), (1 << CELL_BITS) - 1)
+
+
+def _spread(value):
+    # Insert a zero bit between each bit of a value of up to 32 bits
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def _interleave(row, col):
+    return (_spread(row) << 1) | _spread(col)
+
+
+def encode(latitude, longitude):
+    """
+    Return the grid cell code of a point.
+    """
+    return _interleave(_quantize(latitude, -90.0, 180.0), _quantize(longitude, -180.0, 360.0))
+
+
+def cover(min_lat, min_lng, max_lat, max_lng):
+    """
+    Return sorted, non-overlapping ``(low, high)`` code ranges, high exclusive,
+    that contain every cell of the box. A box whose min longitude is greater
+    than its max longitude crosses the antimeridian.
+    """
+    if min_lng > max_lng:
+        boxes = [(min_lat, min_lng, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lng)]
+    else:
+        boxes = [(min_lat, min_lng, max_lat, max_lng)]
+
+    ranges = []
+    for box_min_lat, box_min_lng, box_max_lat, box_max_lng in boxes:
+        row_min, row_max = _quantize(box_min_lat, -90.0, 180.0), _quantize(box_max_lat, -90.0, 180.0)
+        col_min, col_max = _quantize(box_min_lng, -180.0, 360.0), _quantize(box_max_lng, -180.0, 360.0)
+        # Find the finest block size that covers the box with few enough blocks
+        shift = 0
+        while ((row_max >> shift) - (row_min >> shift) + 1) * ((col_max >> shift) - (col_min >> shift) + 1) > MAX_COVER_BLOCKS:
+            shift += 1
+        for row in range(row_min >> shift, (row_max >> shift) + 1):
+            for col in range(col_min >> shift, (col_max >> shift) + 1):
+                low = _interleave(row, col) << (2 * shift)
+                ranges.append((low, low + (1 << (2 * shift))))
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for low, high in ranges[1:]:
+        if low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(high, merged[-1][1]))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def radius_box(latitude, longitude, radius_km):
+    """
+    Return the bounding box ``(min_lat, min_lng, max_lat, max_lng)`` of a circle.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    # Near the poles the circle spans every longitude
+    lng_scale = math.cos(math.radians(latitude))
+    if lng_scale < 1e-6 or radius_km / (KM_PER_DEGREE * lng_scale) >= 180.0:
+        return max(latitude - lat_delta, -90.0), -180.0, min(latitude + lat_delta, 90.0), 180.0
+    lng_delta = radius_km / (KM_PER_DEGREE * lng_scale)
+    min_lng = longitude - lng_delta
+    max_lng = longitude + lng_delta
+    # Wrap around the antimeridian
+    if min_lng < -180.0:
+        min_lng += 360.0
+    if max_lng > 180.0:
+        max_lng -= 360.0
+    return max(latitude - lat_delta, -90.0), min_lng, min(latitude + lat_delta, 90.0), max_lng
@@ -0,0 +1,123 @@
+"""
+Search history retention.
+
+Searches are written in batches by the write-behind buffer (see api.buffers).
+A search identical to the user's previous one is not stored again: the
+previous row's ``hits`` counter is incremented and its ``searched_at`` moved
+to the new search. Two processes flushing the same user's searches at the
+same moment may still store one duplicate; the history is best-effort.
+
+``compact_search_history()``, run periodically by the
+``compact_search_history`` command, deletes rows older than
+``SEARCH_HISTORY['MAX_AGE_DAYS']`` and rows beyond the newest
+``SEARCH_HISTORY['MAX_PER_USER']`` of each user. It deletes in short
+transactions of at most ``batch_size`` rows, so that writers are never
+locked out for long.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import SearchHistory
+
+DEFAULTS = {
+    'MAX_PER_USER': 1000,
+    'MAX_AGE_DAYS': 180,
+}
+
+
+def get_history_setting(name):
+    return getattr(settings, 'SEARCH_HISTORY', {}).get(name, DEFAULTS[name])
+
+
+def _collapse(records):
+    # Merge consecutive identical searches of each user, keeping their order
+    last = {}
+    collapsed = []
+    for record in records:
+        record.query = str(record.query)
+        previous = last.get(record.user_id)
+        if previous is not None and previous.query == record.query:
+            previous.hits += record.hits
+            previous.searched_at = max(previous.searched_at, record.searched_at)
+        else:
+            last[record.user_id] = record
+            collapsed.append(record)
+    return collapsed
+
+
+def record_searches(records):
+    """
+    Store a batch of new SearchHistory instances, counting repeated searches
+    on the user's previous row instead of adding rows.
+    """
+    records = _collapse(records)
+    first = {}
+    for record in records:
+        first.setdefault(record.user_id, record)
+    latest = SearchHistory.objects.filter(user_id=OuterRef('user_id')).order_by('-searched_at', '-id').values('pk')[:1]
+    previous = (
+        SearchHistory.objects.filter(user_id__in=first, pk=Subquery(latest))
+        .values_list('pk', 'user_id', 'query')
+    )
+    repeated = {}
+    for pk, user_id, query in previous:
+        if first[user_id].query == query:
+            repeated[pk] = first[user_id]
+
+    with transaction.atomic():
+        for pk, record in repeated.items():
+            SearchHistory.objects.filter(pk=pk).update(
+                hits=F('hits') + record.hits, searched_at=record.searched_at,
+            )
+        skipped = set(map(id, repeated.values()))
+        SearchHistory.objects.bulk_create([record for record in records if id(record) not in skipped])
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+    # Walk the matching rows in id order, so that no batch scans rows that
+    # an earlier one already looked at
+    deleted = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if pks:
+                SearchHistory.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if len(pks) < batch_size:
+            return deleted
+        last_pk = pks[-1]
+        time.sleep(pause)
+
+
+def compact_search_history(batch_size=500, pause=0.0, max_age_days=None, max_per_user=None):
+    """
+    Delete expired rows and rows beyond each user's cap, ``batch_size`` rows
+    per transaction with a ``pause`` in seconds between transactions. Return
+    the numbers of expired and capped rows deleted.
+    """
+    if max_age_days is None:
+        max_age_days = get_history_setting('MAX_AGE_DAYS')
+    if max_per_user is None:
+        max_per_user = get_history_setting('MAX_PER_USER')
+
+    cutoff = timezone.now() - datetime.timedelta(days=max_age_days)
+    expired = _delete_in_batches(SearchHistory.objects.filter(searched_at__lt=cutoff), batch_size, pause)
+
+    capped = 0
+    over_cap = (
+        SearchHistory.objects.values('user_id').annotate(rows=Count('id')).filter(rows__gt=max_per_user)
+        .values_list('user_id', flat=True).order_by()
+    )
+    for user_id in list(over_cap):
+        history = SearchHistory.objects.filter(user_id=user_id)
+        # The newest row that goes: it and everything older than it
+        searched_at, pk = history.order_by('-searched_at', '-id').values_list('searched_at', 'id')[max_per_user]
+        older = history.filter(Q(searched_at__lt=searched_at) | Q(searched_at=searched_at, id__lte=pk))
+        capped += _delete_in_batches(older, batch_size, pause)
+    return expired, capped
@@ -0,0 +1,132 @@
+"""
+Bulk import of estates from NDJSON or CSV streams.
+
+Rows are read one line at a time, validated with ``EstateSerializer`` and
+inserted with ``bulk_create`` in chunks of ``batch_size`` rows, one
+transaction per chunk. Memory use depends on the chunk size, not on the size
+of the input. Invalid rows are skipped and reported with their line number;
+valid rows are imported, and chunks already committed stay imported.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from . import search
+from .cache import bump_estate_versions
+from .models import Estate
+from .serializers import EstateSerializer
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+}
+BATCH_SIZE = 500
+# Errors past this many are counted but not listed in the report
+MAX_REPORTED_ERRORS = 1000
+
+
+def _lines(stream):
+    # Binary file objects and Django requests both read one line at a time
+    for line_no, line in enumerate(iter(stream.readline, b''), 1):
+        if line_no == 1 and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        yield line_no, line
+
+
+def read_ndjson(stream):
+    """
+    Yield ``(line, row, error)`` for each non-blank line of an NDJSON stream.
+    """
+    for line_no, line in _lines(stream):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, {'non_field_errors': ['Invalid JSON.']}
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield line_no, row, None
+
+
+def read_csv(stream):
+    """
+    Yield ``(line, row, error)`` for each record of a CSV stream with a header row.
+    Empty cells are left out, so optional columns may be blank.
+    """
+    decode_error = []
+
+    def decoded():
+        for line_no, line in _lines(stream):
+            try:
+                yield line.decode('utf-8')
+            except UnicodeDecodeError:
+                decode_error.append(line_no)
+                return
+
+    reader = csv.DictReader(decoded())
+    try:
+        for record in reader:
+            if None in record:
+                yield reader.line_num, None, {'non_field_errors': ['More values than columns.']}
+                continue
+            yield reader.line_num, {key: value for key, value in record.items() if value not in ('', None)}, None
+    except csv.Error as exc:
+        yield reader.line_num, None, {'non_field_errors': [f'Invalid CSV: {exc}.']}
+        return
+    if decode_error:
+        # The rest of the stream cannot be split into records reliably
+        yield decode_error[0], None, {'non_field_errors': ['Invalid UTF-8, import stopped.']}
+
+
+def read_rows(stream, format):
+    return read_ndjson(stream) if format == 'ndjson' else read_csv(stream)
+
+
+def import_estates(rows, owner_id, batch_size=BATCH_SIZE, max_reported_errors=MAX_REPORTED_ERRORS):
+    """
+    Validate and insert rows from ``read_rows()`` as estates of the given owner.
+
+    Returns a report: the numbers of created and failed rows, and the errors
+    of the first ``max_reported_errors`` failed rows by line number.
+    """
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    # One unbound serializer validates every row, so its fields are built once
+    serializer = EstateSerializer()
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch_size)):
+        estates = []
+        for line_no, row, error in chunk:
+            if error is None:
+                try:
+                    estates.append(Estate(owner_id=owner_id, **serializer.run_validation(row)))
+                    continue
+                except ValidationError as exc:
+                    error = exc.detail
+            report['failed'] += 1
+            if len(report['errors']) < max_reported_errors:
+                report['errors'].append({'line': line_no, 'errors': error})
+        if estates:
+            _insert(estates)
+            report['created'] += len(estates)
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    return report
+
+
+def _insert(estates):
+    # bulk_create() skips save() and the post_save signal, so do their work here
+    for estate in estates:
+        estate.set_geo_cell()
+    with transaction.atomic():
+        Estate.objects.bulk_create(estates)
+        # Backends that cannot return the new ids have no separate search index
+        search.index_estates([estate for estate in estates if estate.pk is not None])
+        # New estates have no cached detail responses, only the list changes
+        transaction.on_commit(lambda: bump_estate_versions([]))
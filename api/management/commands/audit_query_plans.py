@@ -0,0 +1,381 @@
+import datetime
+import json
+import re
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches as django_caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api import urls as api_urls
+from api.authentication import ClaimsRefreshToken
+from api.models import Booking, CustomUser, Estate, SearchHistory
+
+# A request whose SQL is explained: the path is built from the context
+Case = namedtuple('Case', ['name', 'route', 'method', 'user', 'path', 'body'])
+
+_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+_QUOTED = r'[`"](\w+)[`"]'
+# "api_estate" T3 or `api_estate` T3
+_ALIAS = re.compile(_QUOTED + r'\s+(T\d+)\b')
+# "api_estate"."price" or T3."price"
+_COLUMN = re.compile(r'(?:' + _QUOTED + r'|\b(T\d+))\.' + _QUOTED)
+_COMPARISON = re.compile(_COLUMN.pattern + r'\s*(=|IN\b|IS\b|>=|<=|>|<|BETWEEN\b|LIKE\b|GLOB\b)', re.IGNORECASE)
+_CLAUSE_END = re.compile(r'\b(?:GROUP BY|ORDER BY|LIMIT|HAVING)\b')
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the SQL of every API view, requested with representative parameters through '
+        'the Django test client, and flag full table scans and temporary sorts with suggested indexes. '
+        'Compared with a stored baseline, exits non-zero when a query gains a scan or a sort. Runs in a '
+        'transaction that is rolled back, on SQLite or MySQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', help='Only audit the cases whose names contain one of these.')
+        parser.add_argument('--baseline', help='JSON file of a previous audit to compare with.')
+        parser.add_argument('--save-baseline', help='Write the plans and findings to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            raise CommandError(f'Query plans of {connection.vendor} are not supported.')
+
+        # As in benchmark_endpoints: no cached responses, which would skip the
+        # queries, and buffered writes run inside the transaction
+        caches = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'audit-{alias}'}
+            for alias in settings.CACHES
+        }
+        with override_settings(
+            CACHES=caches,
+            WRITE_BEHIND_BUFFER={**getattr(settings, 'WRITE_BEHIND_BUFFER', {}), 'ENABLED': False},
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            DEBUG=False,
+        ), transaction.atomic():
+            for alias in caches:
+                django_caches[alias].clear()
+            results = {case.name: self.audit(case) for case in self.get_cases(self.prepare(), options)}
+            transaction.set_rollback(True)
+
+        self.report(results, options)
+
+    def prepare(self):
+        """
+        Pick the rows whose plans are representative: the users with the
+        most data, since plans for empty results tell little.
+        """
+        busiest_tenant = SearchHistory.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+        busiest_landlord = (
+            Estate.objects.values('owner_id').annotate(n=Count('id')).order_by('-n').first()
+        )
+        if busiest_tenant is None or busiest_landlord is None:
+            raise CommandError('The database has no estates or search history; run generate_data first.')
+        landlord = CustomUser.objects.get(pk=busiest_landlord['owner_id'])
+        booking = Booking.objects.order_by('-id').first()
+        estate = Estate.objects.filter(owner=landlord, is_active=True).order_by('id').first()
+        return {
+            'tenant': CustomUser.objects.get(pk=busiest_tenant['user_id']),
+            'landlord': landlord,
+            'booker': booking.tenant if booking else landlord,
+            'booking': booking,
+            'estate': estate or Estate.objects.order_by('id').first(),
+        }
+
+    def get_cases(self, ctx, options):
+        estate, booking = ctx['estate'], ctx['booking']
+        estate_list = reverse('estate-list')
+        history = reverse('search-history')
+        visitors = reverse('visitors-list')
+        today = timezone.localdate()
+        stay = (today + datetime.timedelta(days=7), today + datetime.timedelta(days=14))
+        cases = [
+            Case('estate-list', 'estate-list', 'GET', None, estate_list, None),
+            Case('estate-list:price', 'estate-list', 'GET', None, f'{estate_list}?price_min=1000&price_max=5000', None),
+            Case('estate-list:title', 'estate-list', 'GET', None, f'{estate_list}?title={quote(estate.title)}', None),
+            Case('estate-list:location', 'estate-list', 'GET', None, f'{estate_list}?location=Москва', None),
+            Case('estate-list:price-desc', 'estate-list', 'GET', None, f'{estate_list}?ordering=-price', None),
+            Case('estate-list:rating', 'estate-list', 'GET', None, f'{estate_list}?ordering=-rating_avg', None),
+            Case('estate-list:search', 'estate-list', 'GET', None, f'{estate_list}?q=квартира', None),
+            Case('estate-list:near', 'estate-list', 'GET', None, f'{estate_list}?near=55.7558,37.6173,10', None),
+            Case('estate-list:available', 'estate-list', 'GET', None,
+                 f'{estate_list}?check_in={stay[0]}&check_out={stay[1]}', None),
+            Case('estate-detail', 'estate-detail', 'GET', None, reverse('estate-detail', args=[estate.pk]), None),
+            Case('estate-similar', 'estate-similar', 'GET', None, reverse('estate-similar', args=[estate.pk]), None),
+            Case('estate-update', 'estate-update', 'PATCH', 'landlord',
+                 reverse('estate-update', args=[estate.pk]), {'price': '3000'}),
+            Case('estate-bulk-update', 'estate-bulk-update', 'PATCH', 'landlord',
+                 reverse('estate-bulk-update'), [{'id': estate.pk, 'price': '3000'}]),
+            Case('estate-delete', 'estate-delete', 'DELETE', 'landlord',
+                 reverse('estate-delete', args=[estate.pk]), None),
+            Case('booking-create', 'booking-create', 'POST', 'tenant', reverse('booking-create'),
+                 {'estate': estate.pk, 'check_in': '2100-01-01', 'check_out': '2100-01-05'}),
+            Case('booking-inbox', 'booking-inbox', 'GET', 'landlord', reverse('booking-inbox'), None),
+            Case('booking-inbox:pending', 'booking-inbox', 'GET', 'landlord',
+                 f"{reverse('booking-inbox')}?status=pending&since=2000-01-01", None),
+            Case('review-create', 'review-create', 'POST', 'tenant', reverse('review-create'),
+                 {'estate': estate.pk, 'tenant': ctx['tenant'].pk, 'score': 5, 'comment': 'ok'}),
+            Case('search-history', 'search-history', 'GET', 'tenant', history, None),
+            Case('search-history:period', 'search-history', 'GET', 'tenant', f'{history}?since=2000-01-01', None),
+            Case('visitors-list', 'visitors-list', 'GET', 'landlord', visitors, None),
+            Case('visitors-list:period', 'visitors-list', 'GET', 'landlord', f'{visitors}?since=2000-01-01', None),
+            Case('visitors-list:daily', 'visitors-list', 'GET', 'landlord', f'{visitors}?aggregate=daily', None),
+        ]
+        if booking is not None:
+            cases.append(Case('booking-retrieve', 'booking-retrieve', 'GET', 'booker',
+                              reverse('booking-retrieve', args=[booking.pk]), None))
+
+        # Routes whose queries do not depend on the data
+        skipped = {'user-register', 'user-login', 'estate-create', 'estate-import', 'schema', 'swagger-ui', 'redoc'}
+        covered = {case.route for case in cases}
+        for pattern in api_urls.urlpatterns:
+            if pattern.name not in covered | skipped:
+                self.stderr.write(self.style.WARNING(f'Route {pattern.name!r} has no query plan case.'))
+
+        if options['only']:
+            cases = [case for case in cases if any(part in case.name for part in options['only'])]
+        self.ctx = ctx
+        return cases
+
+    def audit(self, case):
+        client = Client(raise_request_exception=False)
+        headers = {}
+        if case.user is not None:
+            token = ClaimsRefreshToken.for_user(self.ctx[case.user]).access_token
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip()[:6].upper() in _STATEMENTS:
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        # Explained after the request, in a savepoint, so that the changes
+        # of a write case do not leak into the next case
+        sid = transaction.savepoint()
+        with connection.execute_wrapper(record):
+            response = client.generic(
+                case.method, case.path, json.dumps(case.body) if case.body is not None else '',
+                content_type='application/json', **headers,
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        queries = []
+        for sql, params in statements:
+            plan, issues = explain(sql, params)
+            queries.append({
+                'sql': sql,
+                'plan': plan,
+                'issues': issues,
+                'suggestions': [suggestion for issue in issues if (suggestion := suggest_index(sql, issue))],
+            })
+        transaction.savepoint_rollback(sid)
+        return {'status': response.status_code, 'queries': queries}
+
+    def report(self, results, options):
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as baseline_file:
+                    stored = json.load(baseline_file)
+                baseline = stored['cases']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read the baseline {options['baseline']}: {exc}")
+            if stored.get('vendor') != connection.vendor:
+                raise CommandError(f"The baseline was recorded on {stored.get('vendor')}, not {connection.vendor}.")
+
+        problems = []
+        self.stdout.write(f"{'case':<26}{'status':>7}{'queries':>9}  findings")
+        for name, result in results.items():
+            issues = sorted({issue for query in result['queries'] for issue in query['issues']})
+            if result['status'] >= 400:
+                problems.append(f"{name}: {result['status']} response, its plans are not representative")
+            findings = '; '.join(issues) or 'ok'
+            if baseline:
+                base = baseline.get(name, {})
+                known = set(base.get('issues', []))
+                problems.extend(f'{name}: new {issue}' for issue in issues if issue not in known)
+                if name not in baseline:
+                    findings += ' (new case)'
+                elif base.get('plans') != [query['plan'] for query in result['queries']]:
+                    # Worth a look, but only scans and sorts fail the audit
+                    findings += ' (plan changed)'
+            self.stdout.write(f"{name:<26}{result['status']:>7}{len(result['queries']):>9}  {findings}")
+
+            for query in result['queries']:
+                if not query['issues'] and options['verbosity'] < 2:
+                    continue
+                self.stdout.write(f"    {_shorten(query['sql'])}")
+                for line in query['plan']:
+                    self.stdout.write(f'      {line}')
+                for suggestion in query['suggestions']:
+                    self.stdout.write(self.style.NOTICE(f'      suggested index: {suggestion}'))
+
+        if options['save_baseline']:
+            cases = {
+                name: {
+                    'issues': sorted({issue for query in result['queries'] for issue in query['issues']}),
+                    'plans': [query['plan'] for query in result['queries']],
+                }
+                for name, result in results.items()
+            }
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump({'vendor': connection.vendor, 'cases': cases}, baseline_file, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f"Plans saved to {options['save_baseline']}.")
+
+        if problems:
+            raise CommandError('Regressions found:\n' + '\n'.join(problems))
+
+
+def explain(sql, params):
+    """
+    Return the plan of a statement as text lines and its findings, such as
+    'scan of api_visit' or 'temporary sort for ORDER BY on api_estate'.
+    """
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return _sqlite_findings([row[3] for row in cursor.fetchall()], aliases, sql)
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0].lower() for column in cursor.description]
+        return _mysql_findings([dict(zip(columns, row)) for row in cursor.fetchall()], aliases)
+
+
+def _sqlite_findings(details, aliases, sql):
+    issues = []
+    for detail in details:
+        words = detail.split()
+        # "SCAN api_visit", but not "SCAN api_estate USING INDEX ..." (an
+        # ordered index walk), virtual tables or subquery results
+        if words[0] == 'SCAN' and len(words) == 2 and not words[1].startswith('('):
+            table = aliases.get(words[1], words[1])
+            if not _walks_primary_key(sql, table, details):
+                issues.append(f'scan of {table}')
+        elif detail.startswith('USE TEMP B-TREE FOR '):
+            clause = detail[len('USE TEMP B-TREE FOR '):].replace('RIGHT PART OF ', '')
+            issues.append(f'temporary sort for {clause} on {_main_table(sql)}')
+    return details, issues
+
+
+def _walks_primary_key(sql, table, details):
+    """
+    Whether a SCAN of the main table walks it in primary key order until the
+    LIMIT is reached: an ordered walk of the table's own b-tree, which MySQL
+    reports as type=index rather than a scan.
+    """
+    model = next((model for model in apps.get_models() if model._meta.db_table == table), None)
+    if model is None or table != _main_table(sql) or any(detail.startswith('USE TEMP B-TREE') for detail in details):
+        return False
+    _, order = _clauses(sql)
+    match = re.match(r'\s*(?:(\d+)|(\S+))(?:\s+(?:ASC|DESC))?\s+LIMIT\b', order)
+    if match is None:
+        return False
+    term = match.group(2)
+    if match.group(1):
+        # ORDER BY 1: the first selected column
+        columns = sql[sql.index('SELECT') + 6:sql.index(' FROM ')].split(',')
+        term = columns[int(match.group(1)) - 1] if int(match.group(1)) <= len(columns) else ''
+    column = _COLUMN.match(term.strip())
+    return column is not None and column.group(1) == table and column.group(3) == model._meta.pk.column
+
+
+def _mysql_findings(rows, aliases):
+    plan, issues = [], []
+    for row in rows:
+        table = aliases.get(row['table'], row['table'])
+        extra = row.get('extra') or ''
+        plan.append(f"{table}: type={row['type']} key={row['key']} rows={row['rows']} {extra}".rstrip())
+        if table is None or table.startswith('<'):
+            # Derived and union results
+            continue
+        if row['type'] == 'ALL':
+            issues.append(f'scan of {table}')
+        if 'Using filesort' in extra:
+            issues.append(f'temporary sort for ORDER BY on {table}')
+        if 'Using temporary' in extra:
+            issues.append(f'temporary table on {table}')
+    return plan, issues
+
+
+def _main_table(sql):
+    match = re.search(r'\bFROM\s+' + _QUOTED, sql)
+    return match.group(1) if match else '?'
+
+
+def suggest_index(sql, issue):
+    """
+    Suggest a model index for a finding: the columns of the table compared
+    for equality in the WHERE clause, then either one compared with a range
+    or the columns the result is sorted by. Returns None when the table is
+    not filtered, or when an index of the model already starts with these
+    columns.
+    """
+    table = issue.rsplit(' ', 1)[-1]
+    model = next((model for model in apps.get_models() if model._meta.db_table == table), None)
+    if model is None:
+        return None
+    names = {table} | {alias for aliased, alias in _ALIAS.findall(sql) if aliased == table}
+    where, order = _clauses(sql)
+    equal, ranged = [], []
+    for quoted, alias, column, operator in _COMPARISON.findall(where):
+        if (quoted or alias) in names:
+            # Bare boolean tests ("is_active") cannot seek on an index
+            (equal if operator.upper() in ('=', 'IN', 'IS') else ranged).append(column)
+    if not equal and not ranged:
+        return None
+    columns = list(dict.fromkeys(equal))
+    if ranged:
+        # Columns after a range cannot order the result
+        columns += [column for column in ranged[:1] if column not in columns]
+    else:
+        columns += [
+            column for quoted, alias, column in _COLUMN.findall(order)
+            if (quoted or alias) in names and column not in columns
+        ]
+    # Secondary indexes end with the primary key in SQLite and InnoDB
+    pk = model._meta.pk.column
+    while len(columns) > 1 and columns[-1] == pk:
+        columns.pop()
+
+    fields = {field.column: field for field in model._meta.concrete_fields}
+    existing = [[pk]]
+    existing += [[field.column, pk] for field in fields.values() if field.db_index or field.unique]
+    existing += [[model._meta.get_field(name).column for name in index.fields] + [pk] for index in model._meta.indexes]
+    existing += [
+        [model._meta.get_field(name).column for name in constraint.fields] + [pk]
+        for constraint in model._meta.constraints if getattr(constraint, 'fields', None)
+    ]
+    if any(index[:len(columns)] == columns for index in existing):
+        return None
+    field_names = ', '.join(repr(fields[column].name) for column in columns)
+    return f'{model.__name__}: models.Index(fields=[{field_names}])'
+
+
+def _clauses(sql):
+    # The WHERE and ORDER BY clauses of the outermost statement
+    where = order = ''
+    where_at = sql.find(' WHERE ')
+    if where_at >= 0:
+        rest = sql[where_at + 7:]
+        end = _CLAUSE_END.search(rest)
+        where = rest[:end.start()] if end else rest
+    order_at = sql.rfind(' ORDER BY ')
+    if order_at >= 0:
+        order = sql[order_at + 10:]
+    return where, order
+
+
+def _shorten(sql, width=160):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= width else sql[:width - 3] + '...'
@@ -0,0 +1,341 @@
+import datetime
+import json
+import math
+import statistics
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches as django_caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api import urls as api_urls
+from api.authentication import ClaimsRefreshToken
+from api.docs import get_docs_setting
+from api.models import Booking, CustomUser, Estate, SearchHistory, VisitDailyStats
+
+# A request made on each iteration i: (path, body, content type)
+Scenario = namedtuple('Scenario', ['name', 'route', 'method', 'user', 'build'])
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every route of the API through the Django test client against the configured '
+        'database: latency percentiles and SQL query counts per endpoint, optionally compared with '
+        'a stored baseline. Runs in a transaction that is rolled back, with an isolated in-memory '
+        'cache and the write-behind buffers turned off. Exits non-zero on regressions or errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='+', help='Only run the scenarios whose names contain one of these.')
+        parser.add_argument('--tenant', help='Username of the tenant whose history is read. Defaults to the busiest.')
+        parser.add_argument('--landlord', help='Username of the landlord whose visitors are read. Defaults to the busiest.')
+        parser.add_argument(
+            '--use-cache', action='store_true',
+            help='Repeat identical GET requests, so that they are answered by the response cache.',
+        )
+        parser.add_argument('--baseline', help='JSON file of a previous run to compare with.')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed relative p95 latency increase over the baseline.',
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=2.0,
+            help='p95 increases below this many milliseconds are never regressions.',
+        )
+
+    def handle(self, *args, **options):
+        total = options['warmup'] + options['iterations']
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive.')
+
+        # Responses built from rolled-back data must not reach the shared
+        # cache, buffered writes must happen inside the transaction, and
+        # repeated requests must not be throttled
+        caches = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{alias}'}
+            for alias in settings.CACHES
+        }
+        with override_settings(
+            CACHES=caches,
+            WRITE_BEHIND_BUFFER={**getattr(settings, 'WRITE_BEHIND_BUFFER', {}), 'ENABLED': False},
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            DEBUG=False,
+        ), transaction.atomic():
+            for alias in caches:
+                django_caches[alias].clear()
+            scenarios = self.get_scenarios(self.prepare(total, options), options)
+            results = {scenario.name: self.run_scenario(scenario, options) for scenario in scenarios}
+            transaction.set_rollback(True)
+
+        self.report(results, options)
+
+    def prepare(self, total, options):
+        """
+        Create the users and rows that the scenarios read and write.
+        """
+        suffix = uuid.uuid4().hex[:8]
+        tenant = CustomUser.objects.create_user(f'benchmark-tenant-{suffix}', password=PASSWORD, role='tenant')
+        landlord = CustomUser.objects.create_user(f'benchmark-landlord-{suffix}', password=PASSWORD, role='landlord')
+        estate = Estate.objects.create(
+            title='Benchmark estate', description='Benchmark', location='Москва', price=3000,
+            owner=landlord, latitude=55.7558, longitude=37.6173,
+        )
+        doomed = [
+            Estate.objects.create(title='Benchmark estate', description='Benchmark', location='Москва', price=3000, owner=landlord)
+            for _ in range(total)
+        ]
+        booking = Booking.objects.create(
+            estate=estate, tenant=tenant, check_in='2000-01-01', check_out='2000-01-05', status='approved',
+        )
+
+        reader_tenant = reader_landlord = None
+        if options['tenant']:
+            reader_tenant = CustomUser.objects.get(username=options['tenant'])
+        else:
+            busiest = SearchHistory.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+            reader_tenant = CustomUser.objects.get(pk=busiest['user_id']) if busiest else tenant
+        if options['landlord']:
+            reader_landlord = CustomUser.objects.get(username=options['landlord'])
+        else:
+            busiest = (
+                VisitDailyStats.objects.values('estate__owner_id').annotate(n=Sum('visits')).order_by('-n').first()
+            )
+            reader_landlord = CustomUser.objects.get(pk=busiest['estate__owner_id']) if busiest else landlord
+
+        return {
+            'suffix': suffix,
+            'tenant': tenant,
+            'landlord': landlord,
+            'reader_tenant': reader_tenant,
+            'reader_landlord': reader_landlord,
+            'estate': estate,
+            'public_estate': Estate.objects.filter(is_active=True).order_by('id').first(),
+            'doomed': [doomed_estate.pk for doomed_estate in doomed],
+            'booking': booking,
+            'tokens': {},
+        }
+
+    def get_scenarios(self, ctx, options):
+        estate, public_estate = ctx['estate'], ctx['public_estate']
+        estate_payload = {'title': 'Benchmark estate', 'description': 'Benchmark', 'location': 'Москва', 'price': '3000'}
+        import_body = '\n'.join(json.dumps(estate_payload) for _ in range(100))
+
+        def get(path):
+            if options['use_cache']:
+                return lambda i: (path, None, None)
+            separator = '&' if '?' in path else '?'
+            # A unique query string makes every response a cache miss
+            return lambda i: (f'{path}{separator}_={i}', None, None)
+
+        def send(path, payload, content_type='application/json'):
+            return lambda i: (path(i) if callable(path) else path, payload(i), content_type)
+
+        estate_list = reverse('estate-list')
+        scenarios = [
+            Scenario('user-register', 'user-register', 'POST', None, send(
+                reverse('user-register'),
+                lambda i: json.dumps({'username': f"benchmark-new-{ctx['suffix']}-{i}", 'password': PASSWORD, 'role': 'tenant'}),
+            )),
+            Scenario('user-login', 'user-login', 'POST', None, send(
+                reverse('user-login'),
+                lambda i: json.dumps({'username': ctx['tenant'].username, 'password': PASSWORD}),
+            )),
+            Scenario('estate-list', 'estate-list', 'GET', None, get(estate_list)),
+            Scenario('estate-list:page-100', 'estate-list', 'GET', None, get(f'{estate_list}?page_size=100')),
+            Scenario('estate-list:page-1000', 'estate-list', 'GET', None, get(f'{estate_list}?page_size=1000')),
+            Scenario('estate-list:search', 'estate-list', 'GET', None, get(f'{estate_list}?q=квартира')),
+            Scenario('estate-list:area', 'estate-list', 'GET', None, get(
+                f'{estate_list}?price_max=5000&near=55.7558,37.6173,10'
+            )),
+            Scenario('estate-list:available', 'estate-list', 'GET', None, get(
+                f'{estate_list}?check_in={_from_today(7)}&check_out={_from_today(14)}'
+            )),
+            Scenario('estate-list:rating', 'estate-list', 'GET', None, get(f'{estate_list}?ordering=-rating_avg')),
+            Scenario('estate-detail', 'estate-detail', 'GET', None, get(
+                reverse('estate-detail', args=[(public_estate or estate).pk])
+            )),
+            Scenario('estate-similar', 'estate-similar', 'GET', None, get(
+                reverse('estate-similar', args=[(public_estate or estate).pk])
+            )),
+            Scenario('estate-create', 'estate-create', 'POST', 'landlord', send(
+                reverse('estate-create'), lambda i: json.dumps(estate_payload),
+            )),
+            Scenario('estate-import:100', 'estate-import', 'POST', 'landlord', send(
+                reverse('estate-import'), lambda i: import_body, 'application/x-ndjson',
+            )),
+            Scenario('estate-update', 'estate-update', 'PATCH', 'landlord', send(
+                reverse('estate-update', args=[estate.pk]), lambda i: json.dumps({'price': str(3000 + i)}),
+            )),
+            Scenario('estate-bulk-update', 'estate-bulk-update', 'PATCH', 'landlord', send(
+                reverse('estate-bulk-update'),
+                # Two groups of estates given the same values: two UPDATE statements
+                lambda i: json.dumps([
+                    {'id': pk, 'price': str(3000 + i), **({'is_active': False} if n % 2 else {})}
+                    for n, pk in enumerate(ctx['doomed'])
+                ]),
+            )),
+            Scenario('estate-delete', 'estate-delete', 'DELETE', 'landlord', send(
+                lambda i: reverse('estate-delete', args=[ctx['doomed'][i]]), lambda i: '',
+            )),
+            Scenario('booking-create', 'booking-create', 'POST', 'tenant', send(
+                reverse('booking-create'),
+                lambda i: json.dumps({
+                    'estate': estate.pk, 'check_in': _day(3 * i), 'check_out': _day(3 * i + 2),
+                }),
+            )),
+            Scenario('booking-retrieve', 'booking-retrieve', 'GET', 'tenant', get(
+                reverse('booking-retrieve', args=[ctx['booking'].pk])
+            )),
+            Scenario('booking-inbox', 'booking-inbox', 'GET', 'reader_landlord', get(reverse('booking-inbox'))),
+            Scenario('booking-inbox:pending', 'booking-inbox', 'GET', 'reader_landlord', get(
+                f"{reverse('booking-inbox')}?status=pending&since={_day(0)}"
+            )),
+            Scenario('review-create', 'review-create', 'POST', 'tenant', send(
+                reverse('review-create'),
+                lambda i: json.dumps({'estate': estate.pk, 'tenant': ctx['tenant'].pk, 'score': i % 5 + 1, 'comment': 'ok'}),
+            )),
+            Scenario('search-history', 'search-history', 'GET', 'reader_tenant', get(reverse('search-history'))),
+            Scenario('search-history:export', 'search-history', 'GET', 'reader_tenant', get(
+                f"{reverse('search-history')}?export=ndjson"
+            )),
+            Scenario('visitors-list', 'visitors-list', 'GET', 'reader_landlord', get(reverse('visitors-list'))),
+            Scenario('visitors-list:daily', 'visitors-list', 'GET', 'reader_landlord', get(
+                f"{reverse('visitors-list')}?aggregate=daily"
+            )),
+        ]
+        if get_docs_setting('ENABLED'):
+            scenarios += [
+                Scenario('schema', 'schema', 'GET', None, get(reverse('schema'))),
+                Scenario('swagger-ui', 'swagger-ui', 'GET', None, get(reverse('swagger-ui'))),
+                Scenario('redoc', 'redoc', 'GET', None, get(reverse('redoc'))),
+            ]
+
+        covered = {scenario.route for scenario in scenarios}
+        for pattern in api_urls.urlpatterns:
+            if pattern.name not in covered:
+                self.stderr.write(self.style.WARNING(f'Route {pattern.name!r} has no benchmark scenario.'))
+
+        if options['only']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if any(part in scenario.name for part in options['only'])
+            ]
+        self.ctx = ctx
+        return scenarios
+
+    def get_headers(self, user_key):
+        if user_key is None:
+            return {}
+        tokens = self.ctx['tokens']
+        if user_key not in tokens:
+            tokens[user_key] = str(ClaimsRefreshToken.for_user(self.ctx[user_key]).access_token)
+        return {'HTTP_AUTHORIZATION': f'Bearer {tokens[user_key]}'}
+
+    def run_scenario(self, scenario, options):
+        client = Client(raise_request_exception=False)
+        headers = self.get_headers(scenario.user)
+        latencies, query_counts, errors = [], [], 0
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        for i in range(options['warmup'] + options['iterations']):
+            path, body, content_type = scenario.build(i)
+            extra = dict(headers)
+            if content_type is not None:
+                extra['content_type'] = content_type
+            queries = 0
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                response = client.generic(scenario.method, path, body or '', **extra)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if i < options['warmup']:
+                continue
+            latencies.append(elapsed * 1000)
+            query_counts.append(queries)
+            if response.status_code >= 400:
+                errors += 1
+
+        latencies.sort()
+        return {
+            'p50_ms': round(_percentile(latencies, 50), 3),
+            'p95_ms': round(_percentile(latencies, 95), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries': max(query_counts),
+            'errors': errors,
+        }
+
+    def report(self, results, options):
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as baseline_file:
+                    baseline = json.load(baseline_file)['endpoints']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read the baseline {options['baseline']}: {exc}")
+
+        problems = []
+        self.stdout.write(
+            f"{'endpoint':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}  baseline"
+        )
+        for name, result in results.items():
+            comparison = ''
+            base = baseline.get(name)
+            if base is not None:
+                change = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+                comparison = f"p95 {change:+.0f}%, queries {result['queries'] - base['queries']:+d}"
+                if (result['p95_ms'] > base['p95_ms'] * (1 + options['tolerance'])
+                        and result['p95_ms'] - base['p95_ms'] > options['min_delta_ms']):
+                    problems.append(f"{name}: p95 {result['p95_ms']} ms, baseline {base['p95_ms']} ms")
+                if result['queries'] > base['queries']:
+                    problems.append(f"{name}: {result['queries']} queries, baseline {base['queries']}")
+            elif baseline:
+                comparison = 'new'
+            if result['errors']:
+                problems.append(f"{name}: {result['errors']} error responses")
+            self.stdout.write(
+                f"{name:<26}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['queries']:>9}{result['errors']:>8}  {comparison}"
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump({'iterations': options['iterations'], 'endpoints': results}, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(f"Results saved to {options['save_baseline']}.")
+
+        if problems:
+            raise CommandError('Regressions found:\n' + '\n'.join(problems))
+
+
+def _percentile(values, percent):
+    # Nearest-rank percentile of sorted values
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def _from_today(offset):
+    return (timezone.localdate() + datetime.timedelta(days=offset)).isoformat()
+
+
+def _day(offset):
+    # Far enough in the future not to collide with real bookings
+    return (datetime.date(2100, 1, 1) + datetime.timedelta(days=offset)).isoformat()
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import ValuesRepresentation
+from api.models import Estate, SearchHistory, Visit
+from api.renderers import ORJSONRenderer
+from api.serializers import EstateSerializer, SearchHistorySerializer, VisitSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the rows per second of the list endpoints built through DRF serializers and the JSON '
+        'renderer with the fast path (values_list() rows, compiled field mappings and orjson), '
+        'query included, against the configured database. Fails if the two outputs differ.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000])
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        busiest_tenant = SearchHistory.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+        busiest_landlord = Visit.objects.values('estate__owner_id').annotate(n=Count('id')).order_by('-n').first()
+        if busiest_tenant is None or busiest_landlord is None:
+            raise CommandError('The database has no visits or search history; run generate_data first.')
+        lists = [
+            ('estate-list', EstateSerializer, Estate.objects.filter(is_active=True).order_by('id')),
+            ('visitors-list', VisitSerializer,
+             Visit.objects.filter(estate__owner_id=busiest_landlord['estate__owner_id']).order_by('id')),
+            ('search-history', SearchHistorySerializer,
+             SearchHistory.objects.filter(user_id=busiest_tenant['user_id']).order_by('-searched_at', '-id')),
+        ]
+
+        self.stdout.write(f"{'list':<16}{'rows':>6}{'DRF rows/s':>13}{'fast rows/s':>13}{'speedup':>9}  identical")
+        different = []
+        for name, serializer_class, queryset in lists:
+            representation = ValuesRepresentation.for_serializer(serializer_class)
+            for page_size in options['page_sizes']:
+
+                def drf():
+                    return JSONRenderer().render(serializer_class(list(queryset[:page_size]), many=True).data)
+
+                def fast():
+                    return ORJSONRenderer().render(representation.represent(representation.get_rows(queryset)[:page_size]))
+
+                identical = drf() == fast()
+                if not identical:
+                    different.append(f'{name} at {page_size} rows')
+                rows = min(page_size, queryset.count())
+                drf_rate, fast_rate = (rows * options['iterations'] / self.measure(build, options) for build in (drf, fast))
+                self.stdout.write(
+                    f"{name:<16}{rows:>6}{drf_rate:>13.0f}{fast_rate:>13.0f}{fast_rate / drf_rate:>8.1f}x  "
+                    f"{'yes' if identical else 'NO'}"
+                )
+
+        if different:
+            raise CommandError('The fast path output differs for: ' + ', '.join(different))
+
+    def measure(self, build, options):
+        build()
+        started = time.perf_counter()
+        for _ in range(options['iterations']):
+            build()
+        return time.perf_counter() - started
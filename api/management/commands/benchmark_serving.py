@@ -0,0 +1,130 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import ClaimsRefreshToken
+from api.models import CustomUser, Estate
+
+SERVERS = {
+    # Synchronous WSGI workers serve one request at a time each
+    'wsgi': ['gunicorn', 'rental_app.wsgi:application', '--workers', '{workers}', '--bind', '127.0.0.1:{port}'],
+    # Each ASGI worker serves many requests concurrently through the async views
+    'asgi': ['uvicorn', 'rental_app.asgi:application', '--workers', '{workers}', '--port', '{port}', '--no-access-log'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of the read endpoints served by sync WSGI workers (gunicorn) '
+        'and async ASGI workers (uvicorn) with the same worker count, against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent clients.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server and endpoint.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--tenant', help='Username of a tenant, to benchmark the history endpoint.')
+        parser.add_argument('--landlord', help='Username of a landlord, to benchmark the visitors endpoint.')
+        parser.add_argument(
+            '--use-cache', action='store_true',
+            help='Let requests hit the response cache instead of giving each one a unique query string.',
+        )
+
+    def handle(self, *args, **options):
+        estate = Estate.objects.filter(is_active=True).order_by('id').first()
+        if estate is None:
+            raise CommandError('The database has no active estates to request.')
+        endpoints = [
+            ('estate-list', '/api/estate/', None),
+            ('estate-detail', f'/api/estate/{estate.pk}/', None),
+        ]
+        for option, name, path in (('tenant', 'search-history', '/api/history/'),
+                                   ('landlord', 'visitors-list', '/api/visitors/')):
+            if options[option]:
+                user = CustomUser.objects.get(username=options[option])
+                endpoints.append((name, path, str(ClaimsRefreshToken.for_user(user).access_token)))
+
+        results = {}
+        for server in options['servers']:
+            port = _free_port()
+            command = [part.format(workers=options['workers'], port=port) for part in SERVERS[server]]
+            process = subprocess.Popen(
+                # Without throttling, which would refuse most of the load
+                command, cwd=settings.BASE_DIR,
+                env=dict(os.environ, ASYNC_READ_VIEWS='1' if server == 'asgi' else '0', THROTTLING='0'),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                _wait_for_port(port)
+                for name, path, token in endpoints:
+                    results[server, name] = self.run_load(port, path, token, options)
+            finally:
+                process.terminate()
+                process.wait()
+
+        self.stdout.write(f"{'endpoint':<16}{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name, _, _ in endpoints:
+            for server in options['servers']:
+                rps, p50, p99, errors = results[server, name]
+                self.stdout.write(f'{name:<16}{server:<8}{rps:>10.1f}{p50:>10.2f}{p99:>10.2f}{errors:>8}')
+
+    def run_load(self, port, path, token, options):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        sequence = count()
+        per_client = options['requests'] // options['concurrency']
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            latencies, errors = [], 0
+            for _ in range(per_client):
+                url = path if options['use_cache'] else f'{path}?_={next(sequence)}'
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', url, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors += 1
+                except (OSError, http.client.HTTPException):
+                    errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                latencies.append(time.perf_counter() - started)
+            connection.close()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            outcomes = list(executor.map(lambda _: client(), range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+        errors = sum(client_errors for _, client_errors in outcomes)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return len(latencies) / elapsed, statistics.median(latencies) * 1000, p99 * 1000, errors
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Server on port {port} did not start within {timeout} seconds.')
@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.docs import get_docs_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema in YAML and JSON, each also gzipped, into API_DOCS["SCHEMA_DIR"], '
+        'from where the schema/ endpoint serves it. Run it whenever the API changes (the Docker image '
+        'runs it when it is built).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=get_docs_setting('SCHEMA_DIR'), help='Directory to write the files to.')
+
+    def handle(self, *args, **options):
+        if not get_docs_setting('ENABLED'):
+            raise CommandError('The API docs are turned off (API_DOCS["ENABLED"]).')
+        if not options['dir']:
+            raise CommandError('No directory given and API_DOCS["SCHEMA_DIR"] is not set.')
+        from api.schema import compress, generate_schema
+
+        os.makedirs(options['dir'], exist_ok=True)
+        for schema_format, content in generate_schema().items():
+            for name, data in ((f'schema.{schema_format}', content), (f'schema.{schema_format}.gz', compress(content))):
+                path = os.path.join(options['dir'], name)
+                # Replaced at once, so that a worker starting meanwhile never reads half a file
+                with open(f'{path}.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(f'{path}.tmp', path)
+                self.stdout.write(f'{path}: {len(data)} bytes')
+        self.stdout.write(self.style.SUCCESS('OpenAPI schema written.'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import build_similarities, refresh_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the "similar estates" of every active estate from co-visits, location and price. '
+        'With --incremental, only recompute the estates whose co-visits changed since the last run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Recompute only the estates co-visited since the last run and those without neighbours.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['incremental']:
+            estates = refresh_similarities()
+        else:
+            estates = build_similarities()
+        self.stdout.write(self.style.SUCCESS(
+            f'Similar estates of {estates} estates computed in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,103 @@
+import datetime
+import logging
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from api.authentication import ClaimsRefreshToken
+from api.models import Booking, CustomUser, Estate
+
+PASSWORD = 'race-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that concurrent bookings of one estate cannot overlap: in each round, parallel threads '
+        'POST a booking of the same estate for the same dates through the test client, and exactly one '
+        'of them must get 201 and the others 409. Runs against the configured database with its own '
+        'users and estate, which are deleted afterwards. Exits non-zero if a round fails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20, help='Parallel requests per round.')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['threads'] < 2 or options['rounds'] < 1:
+            raise CommandError('--threads must be at least 2 and --rounds positive.')
+
+        suffix = uuid.uuid4().hex[:8]
+        landlord = CustomUser.objects.create_user(f'race-landlord-{suffix}', password=PASSWORD, role='landlord')
+        tenants = [
+            CustomUser.objects.create_user(f'race-tenant-{suffix}-{i}', password=PASSWORD, role='tenant')
+            for i in range(options['threads'])
+        ]
+        estate = Estate.objects.create(
+            title='Race estate', description='Race check', location='Москва', price=3000, owner=landlord,
+        )
+        caches = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'race-{alias}'}
+            for alias in settings.CACHES
+        }
+        failures = 0
+        # Without a warning logged for each of the expected 409 responses
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            # The shared cache must not keep versions bumped by rows deleted below
+            with override_settings(CACHES=caches, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for number in range(options['rounds']):
+                    check_in = datetime.date.today() + datetime.timedelta(days=30 + number * 10)
+                    statuses = self.run_round(estate, tenants, check_in, check_in + datetime.timedelta(days=3))
+                    saved = Booking.objects.filter(estate=estate, check_in=check_in).count()
+                    passed = statuses == Counter({201: 1, 409: len(tenants) - 1}) and saved == 1
+                    failures += not passed
+                    self.stdout.write(
+                        f"round {number + 1}: {', '.join(f'{count} x {code}' for code, count in sorted(statuses.items()))}, "
+                        f"{saved} booking{'s' if saved != 1 else ''} saved"
+                        f"{'' if passed else '  FAILED'}"
+                    )
+        finally:
+            request_logger.setLevel(level)
+            CustomUser.objects.filter(pk__in=[landlord.pk, *[tenant.pk for tenant in tenants]]).delete()
+
+        if failures:
+            raise CommandError(f'{failures} of {options["rounds"]} rounds did not end with exactly one booking.')
+        self.stdout.write(self.style.SUCCESS('Exactly one booking was accepted in every round.'))
+
+    def run_round(self, estate, tenants, check_in, check_out):
+        # All threads send their request at once
+        barrier = threading.Barrier(len(tenants))
+        statuses = Counter()
+        lock = threading.Lock()
+        body = {'estate': estate.pk, 'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+
+        def book(tenant):
+            client = Client(raise_request_exception=False)
+            token = str(ClaimsRefreshToken.for_user(tenant).access_token)
+            try:
+                barrier.wait()
+                response = client.post(
+                    reverse('booking-create'), body, content_type='application/json',
+                    HTTP_AUTHORIZATION=f'Bearer {token}',
+                )
+                with lock:
+                    statuses[response.status_code] += 1
+            finally:
+                # Every thread has a connection of its own
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(tenant,)) for tenant in tenants]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.history import compact_search_history, get_history_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete search history rows older than SEARCH_HISTORY["MAX_AGE_DAYS"] and rows beyond the newest '
+        'SEARCH_HISTORY["MAX_PER_USER"] of each user, in short batches. Meant to be run periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to wait between batches.')
+        parser.add_argument('--max-age-days', type=int, default=get_history_setting('MAX_AGE_DAYS'))
+        parser.add_argument('--max-per-user', type=int, default=get_history_setting('MAX_PER_USER'))
+
+    def handle(self, *args, **options):
+        expired, capped = compact_search_history(
+            batch_size=options['batch_size'], pause=options['pause'],
+            max_age_days=options['max_age_days'], max_per_user=options['max_per_user'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{expired} expired and {capped} capped search history rows deleted.'
+        ))
@@ -0,0 +1,204 @@
+import datetime
+import random
+from collections import Counter
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import search
+from api.cache import bump_estate_versions
+from api.models import Booking, CustomUser, Estate, Review, SearchHistory, Visit
+from api.occupancy import rebuild_occupancy
+from api.ratings import rebuild_ratings
+from api.rollups import rebuild_visit_stats
+from api.similarity import build_similarities
+
+CITIES = [
+    ('Москва', 55.7558, 37.6173),
+    ('Санкт-Петербург', 59.9343, 30.3351),
+    ('Казань', 55.7963, 49.1088),
+    ('Новосибирск', 55.0084, 82.9357),
+    ('Екатеринбург', 56.8389, 60.6057),
+    ('Нижний Новгород', 56.3269, 44.0059),
+    ('Сочи', 43.5855, 39.7231),
+    ('Калининград', 54.7104, 20.4522),
+]
+KINDS = ['Студия', '1-комнатная квартира', '2-комнатная квартира', '3-комнатная квартира', 'Апартаменты', 'Дом', 'Лофт']
+FEATURES = [
+    'рядом с метро', 'с видом на реку', 'после ремонта', 'с балконом', 'в центре', 'у парка',
+    'с парковкой', 'для семьи с детьми', 'можно с животными', 'с кондиционером', 'у моря', 'в новостройке',
+]
+SENTENCES = [
+    'Светлая и тихая квартира.', 'Есть всё необходимое для жизни.', 'Рядом магазины и кафе.',
+    'Быстрый интернет и рабочее место.', 'Новая мебель и техника.', 'Окна во двор.',
+    'До центра двадцать минут.', 'Заселение в любое время.', 'Чистое постельное бельё и полотенца.',
+    'Удобная транспортная развязка.', 'Консьерж и видеонаблюдение.', 'Стиральная и посудомоечная машины.',
+]
+# Weights of review scores 1 to 5
+SCORE_WEIGHTS = [5, 7, 15, 33, 40]
+# Bookings are spread from this many days ago to this many days ahead, so
+# that the occupancy table and the landlords' inboxes have upcoming stays
+BOOKINGS_PAST_DAYS = 365
+BOOKINGS_FUTURE_DAYS = 180
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a reproducible synthetic data set (users, estates, bookings, reviews, visits and '
+        'search history) for load testing, then rebuild the derived tables and indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='gen', help='Prefix of the generated usernames.')
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--landlords', type=int, default=200)
+        parser.add_argument('--tenants', type=int, default=2000)
+        parser.add_argument('--estates', type=int, default=10000)
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--visits', type=int, default=200000)
+        parser.add_argument('--searches', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=90, help='Visits and searches are spread over this many days.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['landlords'] < 1 or options['tenants'] < 1 or options['estates'] < 1:
+            raise CommandError('At least one landlord, tenant and estate are required.')
+        prefix = options['prefix']
+        if CustomUser.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Users prefixed {prefix!r} already exist, choose another --prefix.')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        # Hashing is deliberately slow, so every user shares one hash
+        password = make_password(options['password'])
+        for role, count in (('landlord', options['landlords']), ('tenant', options['tenants'])):
+            self.create(CustomUser, (
+                CustomUser(username=f'{prefix}-{role}-{i}', password=password, role=role)
+                for i in range(count)
+            ))
+        users = CustomUser.objects.filter(username__startswith=f'{prefix}-').order_by('id')
+        landlord_ids = list(users.filter(role='landlord').values_list('id', flat=True))
+        self.tenant_ids = list(users.filter(role='tenant').values_list('id', flat=True))
+
+        self.create(Estate, (self.make_estate(landlord_ids) for _ in range(options['estates'])))
+        # bulk_create() skips Booking.save(), which copies the estate's owner
+        self.estate_owners = dict(
+            Estate.objects.filter(owner_id__in=landlord_ids).order_by('id').values_list('id', 'owner_id')
+        )
+        estate_ids = list(self.estate_owners)
+        # Popularity follows a Zipf law: a few estates get most of the traffic
+        self.random.shuffle(estate_ids)
+        self.estate_ids = estate_ids
+        self.popularity = list(accumulate(1 / rank for rank in range(1, len(estate_ids) + 1)))
+
+        self.create(Booking, self.make_bookings(options['bookings']))
+        self.create(Review, (self.make_review() for _ in range(options['reviews'])))
+        self.create(Visit, (self.make_visit(options['days']) for _ in range(options['visits'])))
+        self.create(SearchHistory, (self.make_search(options['days']) for _ in range(options['searches'])))
+
+        self.stdout.write('Rebuilding ratings, visit rollups, similar estates and the search index...')
+        repaired = rebuild_ratings(batch_size=self.batch_size)
+        rebuild_visit_stats(batch_size=self.batch_size)
+        build_similarities()
+        rebuild_occupancy()
+        search.rebuild_index()
+        bump_estate_versions(repaired)
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated.'))
+
+    def create(self, model, objs):
+        objs = iter(objs)
+        total = 0
+        while chunk := list(islice(objs, self.batch_size)):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk)
+            total += len(chunk)
+        self.stdout.write(f'{total} {model.__name__} rows created.')
+
+    def popular_estate(self):
+        return self.random.choices(self.estate_ids, cum_weights=self.popularity)[0]
+
+    def make_estate(self, landlord_ids):
+        city, latitude, longitude = self.random.choice(CITIES)
+        kind = self.random.choice(KINDS)
+        estate = Estate(
+            title=f'{kind} {self.random.choice(FEATURES)}',
+            description=' '.join(self.random.sample(SENTENCES, 3)),
+            location=f'{city}, ул. {self.random.choice(["Ленина", "Мира", "Садовая", "Лесная", "Набережная"])}, '
+                     f'{self.random.randint(1, 120)}',
+            price=round(self.random.lognormvariate(8, 0.5), -1),
+            is_active=self.random.random() < 0.9,
+            owner_id=self.random.choice(landlord_ids),
+            # Within about 15 km of the city centre
+            latitude=latitude + self.random.uniform(-0.13, 0.13),
+            longitude=longitude + self.random.uniform(-0.2, 0.2),
+        )
+        # bulk_create() skips save(), which computes the grid cell
+        estate.set_geo_cell()
+        return estate
+
+    def make_bookings(self, count):
+        today = self.now.date()
+        # Each estate is booked in sequence, so that pending and approved
+        # bookings never overlap. Estates are picked uniformly, since a
+        # popular estate still has only so many nights to book. The window
+        # is cut into one slot per booking of the estate, and each stay
+        # starts within its slot.
+        picks = [self.random.choice(self.estate_ids) for _ in range(count)]
+        bookings = Counter(picks)
+        booked = Counter()
+        first = today - datetime.timedelta(days=BOOKINGS_PAST_DAYS)
+        next_free = {}
+        for estate_id in picks:
+            slot = (BOOKINGS_PAST_DAYS + BOOKINGS_FUTURE_DAYS) / bookings[estate_id]
+            start = first + datetime.timedelta(days=int(booked[estate_id] * slot))
+            booked[estate_id] += 1
+            # Stays last up to 14 nights
+            check_in = start + datetime.timedelta(days=self.random.randint(0, max(int(slot) - 14, 0)))
+            check_in = max(check_in, next_free.get(estate_id, check_in))
+            check_out = check_in + datetime.timedelta(days=self.random.randint(1, 14))
+            next_free[estate_id] = check_out
+            if check_out < today:
+                status = self.random.choices(['approved', 'cancelled', 'declined'], [70, 15, 15])[0]
+            else:
+                status = self.random.choices(['pending', 'approved', 'cancelled'], [40, 50, 10])[0]
+            yield Booking(
+                estate_id=estate_id, landlord_id=self.estate_owners[estate_id], tenant_id=self.random.choice(self.tenant_ids),
+                check_in=check_in, check_out=check_out, status=status,
+            )
+
+    def make_review(self):
+        return Review(
+            estate_id=self.popular_estate(), tenant_id=self.random.choice(self.tenant_ids),
+            score=self.random.choices(range(1, 6), SCORE_WEIGHTS)[0],
+            comment=' '.join(self.random.sample(SENTENCES, 2)),
+        )
+
+    def past_moment(self, days):
+        return self.now - datetime.timedelta(seconds=self.random.uniform(0, days * 86400))
+
+    def make_visit(self, days):
+        return Visit(
+            estate_id=self.popular_estate(), visitor_id=self.random.choice(self.tenant_ids),
+            visited_at=self.past_moment(days),
+        )
+
+    def make_search(self, days):
+        # The estate list stores its query parameters as a dict
+        query = {}
+        if self.random.random() < 0.5:
+            query['q'] = self.random.choice(KINDS + FEATURES).split()[-1]
+        if self.random.random() < 0.5:
+            query['location'] = self.random.choice(CITIES)[0]
+        if self.random.random() < 0.3:
+            query['price_max'] = str(self.random.choice([2000, 3000, 5000, 10000]))
+        return SearchHistory(
+            user_id=self.random.choice(self.tenant_ids), query=query, searched_at=self.past_moment(days),
+            # Repeated identical searches are stored once with a count
+            hits=self.random.choices([1, 2, 3, 5], [80, 10, 7, 3])[0],
+        )
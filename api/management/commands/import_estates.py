@@ -0,0 +1,56 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import imports
+from api.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-import estates for a landlord from an NDJSON or CSV file (or - for stdin), '
+        'in batches, reporting invalid rows by line number.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - to read standard input.')
+        parser.add_argument('--owner', required=True, help='Username of the landlord who will own the estates.')
+        parser.add_argument(
+            '--format', choices=imports.FORMATS,
+            help='Input format. Guessed from the file extension by default.',
+        )
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE)
+        parser.add_argument('--max-errors', type=int, default=imports.MAX_REPORTED_ERRORS,
+                            help='Number of invalid rows to list.')
+
+    def handle(self, *args, **options):
+        owner = CustomUser.objects.filter(username=options['owner']).first()
+        if owner is None or owner.role != 'landlord':
+            raise CommandError(f"No landlord named {options['owner']!r}.")
+
+        format = options['format']
+        if format is None:
+            extension = os.path.splitext(options['path'])[1].lstrip('.').lower()
+            format = {'ndjson': 'ndjson', 'jsonl': 'ndjson', 'csv': 'csv'}.get(extension)
+            if format is None:
+                raise CommandError('Cannot guess the input format, pass --format.')
+
+        if options['path'] == '-':
+            stream = sys.stdin.buffer
+        else:
+            try:
+                stream = open(options['path'], 'rb')
+            except OSError as exc:
+                raise CommandError(exc)
+        with stream:
+            report = imports.import_estates(
+                imports.read_rows(stream, format), owner_id=owner.pk,
+                batch_size=options['batch_size'], max_reported_errors=options['max_errors'],
+            )
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if report['errors_truncated']:
+            self.stderr.write(f"... {report['failed'] - len(report['errors'])} more invalid rows")
+        self.stdout.write(self.style.SUCCESS(f"{report['created']} estates imported, {report['failed']} rows failed."))
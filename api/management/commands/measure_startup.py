@@ -0,0 +1,99 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: load the WSGI application as a worker does, with
+# DEBUG off, and serve one request. Prints the figures as JSON.
+WORKER = '''
+import io, json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rental_app.settings')
+from django.conf import settings
+settings.DEBUG = False
+settings.ALLOWED_HOSTS = ['localhost']
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+path, _, query = sys.argv[1].partition('?')
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+}
+statuses = []
+body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+served = time.perf_counter()
+print(json.dumps({
+    'status': statuses[0], 'ready': ready - started, 'first_request': served - ready,
+    'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'modules': len(sys.modules),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the cold start of a worker process (time to load the application and to serve its first '
+        'request, peak memory, imported modules) with the API docs turned on and off, and the first '
+        'schema request with a generated and with a prebuilt schema. Each figure is the median of '
+        'several fresh processes, run against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Processes started per configuration.')
+        parser.add_argument('--path', default='/api/estate/?page_size=1', help='Request served by each process.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be positive.')
+        # Without prebuilt files the schema is generated on the first request
+        empty_dir = tempfile.mkdtemp(prefix='estate4rent-schema-')
+        with tempfile.TemporaryDirectory(prefix='estate4rent-schema-') as schema_dir:
+            subprocess.run(
+                [sys.executable, 'manage.py', 'build_schema', '--dir', schema_dir],
+                cwd=settings.BASE_DIR, check=True, stdout=subprocess.DEVNULL,
+                env={**os.environ, 'API_DOCS': '1'},
+            )
+            configurations = [
+                ('docs on', options['path'], {'API_DOCS': '1'}),
+                ('docs off', options['path'], {'API_DOCS': '0'}),
+                ('schema, generated', '/api/schema/', {'API_DOCS': '1', 'SCHEMA_DIR': empty_dir}),
+                ('schema, prebuilt', '/api/schema/', {'API_DOCS': '1', 'SCHEMA_DIR': schema_dir}),
+            ]
+            results = [
+                (name, path, [self.run_worker(path, env) for _ in range(options['runs'])])
+                for name, path, env in configurations
+            ]
+        os.rmdir(empty_dir)
+
+        self.stdout.write(
+            f"{'configuration':<20}{'request':<28}{'status':<8}{'spawn to ready':>15}{'first request':>15}"
+            f"{'max RSS':>10}{'modules':>9}"
+        )
+        for name, path, runs in results:
+            median = {key: statistics.median(run[key] for run in runs) for key in ('process', 'first_request', 'maxrss', 'modules')}
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            maxrss = median['maxrss'] / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+            self.stdout.write(
+                f"{name:<20}{path:<28}{runs[0]['status'].split()[0]:<8}{median['process'] * 1000:>12.0f} ms"
+                f"{median['first_request'] * 1000:>12.1f} ms{maxrss:>7.1f} MB{median['modules']:>9.0f}"
+            )
+
+    def run_worker(self, path, env):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-c', WORKER, path], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, **env},
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'The worker failed:\n{completed.stderr}')
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        # From the spawn of the process until it is ready to serve, interpreter start included
+        result['process'] = time.perf_counter() - started - result['first_request']
+        return result
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.occupancy import prune_occupancy, rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the per-night estate occupancy used by availability searches from the pending and '
+        'approved bookings. With --prune, only delete the nights before today (run it daily).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Only delete the nights before today.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'{prune_occupancy()} past occupancy rows deleted.'))
+            return
+        rows = rebuild_occupancy()
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} occupancy rows written in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_estate_versions
+from api.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating aggregates of every estate from the review table, repairing any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repaired = rebuild_ratings(batch_size=options['batch_size'])
+        if repaired:
+            bump_estate_versions(repaired)
+        self.stdout.write(self.style.SUCCESS(f'Ratings rebuilt, {len(repaired)} estates repaired.'))
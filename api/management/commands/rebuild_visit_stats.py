@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild_visit_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-estate, per-day visit rollups from the raw visit table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuild_visit_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Visit rollups rebuilt.'))
@@ -0,0 +1,157 @@
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, transaction
+
+from api.models import Booking, CustomUser, Estate, SearchHistory
+
+MODES = {
+    # The settings this project ships with
+    'default': {'SQLITE_PRODUCTION': '0'},
+    # WAL, tuned pragmas and serialized writers
+    'production': {'SQLITE_PRODUCTION': '1'},
+}
+ESTATES = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of concurrent readers and writers on SQLite in the default and the '
+        'production mode (SQLITE_PRODUCTION). Each mode runs against a fresh database in a temporary '
+        'directory, with one process per simulated worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds each mode is run for.')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of operations that write.')
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['default', 'production'])
+        # Used by the processes the command starts
+        parser.add_argument('--seed', action='store_true', help='Fill the database with estates and exit.')
+        parser.add_argument('--worker', type=int, help='Run the workload as the worker with this number.')
+        parser.add_argument('--start-at', type=float, help='Time at which workers start, as a Unix timestamp.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            return self.seed()
+        if options['worker'] is not None:
+            return self.work(options)
+
+        if settings.DATABASES['default']['ENGINE'] not in ('django.db.backends.sqlite3', 'api.backends.sqlite3'):
+            raise CommandError('This command stresses SQLite; unset DB_ENGINE.')
+        results = {}
+        for mode in options['modes']:
+            with tempfile.TemporaryDirectory() as directory:
+                env = dict(os.environ, DB_NAME=os.path.join(directory, 'stress.sqlite3'), **MODES[mode])
+                self.manage(env, 'migrate', '--verbosity', '0')
+                self.manage(env, 'stress_sqlite', '--seed')
+                results[mode] = self.run_workers(env, options)
+
+        self.stdout.write(
+            f"{'mode':<12}{'reads/s':>10}{'writes/s':>10}{'read p99 ms':>13}{'write p50 ms':>14}"
+            f"{'write p99 ms':>14}{'errors':>8}"
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<12}{result['reads']:>10.1f}{result['writes']:>10.1f}{result['read_p99']:>13.2f}"
+                f"{result['write_p50']:>14.2f}{result['write_p99']:>14.2f}{result['errors']:>8}"
+            )
+
+    def manage(self, env, *arguments):
+        subprocess.run([sys.executable, 'manage.py', *arguments], cwd=settings.BASE_DIR, env=env, check=True)
+
+    def run_workers(self, env, options):
+        # Django starts slowly, so every worker waits for a common start time
+        start_at = time.time() + 5
+        processes = [
+            subprocess.Popen(
+                [sys.executable, 'manage.py', 'stress_sqlite', '--worker', str(number), '--start-at', str(start_at),
+                 '--duration', str(options['duration']), '--write-ratio', str(options['write_ratio'])],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE,
+            )
+            for number in range(options['processes'])
+        ]
+        outcomes = []
+        for process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise CommandError(f'A worker failed with exit code {process.returncode}.')
+            outcomes.append(json.loads(output))
+
+        reads = sorted(latency for outcome in outcomes for latency in outcome['reads'])
+        writes = sorted(latency for outcome in outcomes for latency in outcome['writes'])
+        return {
+            'reads': len(reads) / options['duration'],
+            'writes': len(writes) / options['duration'],
+            'read_p99': _percentile(reads, 0.99) * 1000,
+            'write_p50': _percentile(writes, 0.5) * 1000,
+            'write_p99': _percentile(writes, 0.99) * 1000,
+            'errors': sum(outcome['errors'] for outcome in outcomes),
+        }
+
+    def seed(self):
+        landlord = CustomUser.objects.create_user('stress-landlord', password='stress', role='landlord')
+        CustomUser.objects.create_user('stress-tenant', password='stress', role='tenant')
+        Estate.objects.bulk_create(
+            Estate(title=f'Estate {i}', description='Stress test estate', location='Москва', price=1000 + i,
+                   owner=landlord)
+            for i in range(ESTATES)
+        )
+
+    def work(self, options):
+        tenant = CustomUser.objects.get(username='stress-tenant')
+        estate_ids = list(Estate.objects.values_list('id', flat=True))
+        rng = random.Random(options['worker'])
+        reads, writes, errors = [], [], 0
+        time.sleep(max(0.0, options['start_at'] - time.time()))
+
+        deadline = time.perf_counter() + options['duration']
+        while (started := time.perf_counter()) < deadline:
+            is_write = rng.random() < options['write_ratio']
+            try:
+                if not is_write:
+                    self.read(rng, estate_ids)
+                elif rng.random() < 0.5:
+                    # Like the estate list recording a search
+                    SearchHistory.objects.create(user=tenant, query={'q': 'stress'})
+                else:
+                    self.book(rng, tenant, estate_ids)
+            except OperationalError:
+                # "database is locked" once the busy timeout runs out
+                errors += 1
+                continue
+            (writes if is_write else reads).append(time.perf_counter() - started)
+
+        self.stdout.write(json.dumps({'reads': reads, 'writes': writes, 'errors': errors}))
+
+    def read(self, rng, estate_ids):
+        offset = rng.randrange(ESTATES - 20)
+        list(Estate.objects.filter(is_active=True).order_by('id')[offset:offset + 20])
+        Estate.objects.filter(pk=rng.choice(estate_ids)).first()
+
+    def book(self, rng, tenant, estate_ids):
+        # The same steps as CreateBookingView
+        estate_id = rng.choice(estate_ids)
+        check_in = datetime.date.today() + datetime.timedelta(days=rng.randrange(3650))
+        check_out = check_in + datetime.timedelta(days=rng.randint(1, 7))
+        with transaction.atomic():
+            Estate.objects.select_for_update().filter(pk=estate_id).exists()
+            if not Booking.objects.overlapping(estate_id, check_in, check_out).exists():
+                Booking.objects.create(estate_id=estate_id, tenant=tenant, check_in=check_in, check_out=check_out)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    if fraction == 0.5:
+        return statistics.median(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
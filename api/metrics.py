@@ -0,0 +1,329 @@
+"""
+Per-request instrumentation: SQL query count and time, and the time spent in
+authentication, in the view and in rendering.
+
+The figures of each request are returned in a ``Server-Timing`` header and
+added to histograms labelled with the URL name. Every worker process keeps
+its histograms in memory and saves them to a file in ``REQUEST_METRICS['DIR']``
+at most every ``FLUSH_INTERVAL`` seconds; the ``metrics/`` endpoint merges
+the files of all workers into the Prometheus text format.
+
+With ``REQUEST_METRICS['ENABLED']`` off, the middleware removes itself from
+the chain and no query wrapper is installed; ``phase()`` then costs one
+context variable lookup.
+"""
+import atexit
+import contextvars
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from tempfile import gettempdir
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+    'DIR': None,
+    'FLUSH_INTERVAL': 5.0,
+    'TOKEN': '',
+}
+
+PREFIX = 'estate4rent_http_request'
+# Prometheus' default latency buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+PHASES = ('auth', 'view', 'render', 'db')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_no_phase = nullcontext()
+
+
+def get_metrics_setting(name):
+    return getattr(settings, 'REQUEST_METRICS', {}).get(name, DEFAULTS[name])
+
+
+class RequestMetrics:
+    """
+    Timings of the request being served, in seconds.
+    """
+    __slots__ = ('started', 'view_started', 'render_started', 'phases', 'queries')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.render_started = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+
+
+class _Phase:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metrics.phases[self.name] += time.perf_counter() - self.started
+
+
+def phase(name):
+    """
+    Context manager adding the time spent in its block to a phase of the
+    current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return _no_phase
+    return _Phase(metrics, name)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.phases['db'] += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def _install_query_recorder(connection, **kwargs):
+    # The context variable follows requests into the threads that run the
+    # async views' queries, so every connection reports to its request
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class _Registry:
+    """
+    Histograms and counters of this process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # (name, labels) -> [count per bucket..., count above the last, sum]
+        self.histograms = {}
+        # (name, labels) -> value
+        self.counters = {}
+        self.flushed_at = time.monotonic()
+
+    def observe(self, name, labels, value, buckets):
+        series = self.histograms.get((name, labels))
+        if series is None:
+            series = self.histograms[(name, labels)] = [0] * (len(buckets) + 1) + [0.0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(buckets)
+        series[index] += 1
+        series[-1] += value
+
+    def record(self, view, method, status, metrics, total):
+        labels = (('view', view), ('method', method))
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked: the parent's figures are not ours to report
+                self.reset()
+            self.observe(f'{PREFIX}_duration_seconds', labels, total, DURATION_BUCKETS)
+            for name, seconds in metrics.phases.items():
+                self.observe(f'{PREFIX}_phase_duration_seconds', labels + (('phase', name),), seconds, DURATION_BUCKETS)
+            self.observe(f'{PREFIX}_db_queries', labels, metrics.queries, QUERY_BUCKETS)
+            key = (f'{PREFIX}s_total', labels + (('status', str(status)),))
+            self.counters[key] = self.counters.get(key, 0) + 1
+        if time.monotonic() - self.flushed_at >= get_metrics_setting('FLUSH_INTERVAL'):
+            self.flush()
+
+    def flush(self):
+        directory = get_metrics_directory()
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            snapshot = {
+                'histograms': [[name, list(labels), series] for (name, labels), series in self.histograms.items()],
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+            }
+            self.flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.pid}.json')
+        with open(f'{path}.tmp', 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(f'{path}.tmp', path)
+
+
+registry = _Registry()
+
+
+def get_metrics_directory():
+    return get_metrics_setting('DIR') or os.path.join(gettempdir(), 'estate4rent-metrics')
+
+
+def collect():
+    """
+    Merge the saved figures of all worker processes into the Prometheus text format.
+    """
+    registry.flush()
+    histograms, counters = {}, {}
+    for path in glob.glob(os.path.join(get_metrics_directory(), '*.json')):
+        try:
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * (len(series) - 1) + [0.0])
+            for index, value in enumerate(series):
+                merged[index] += value
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+
+    lines = []
+    for metric_name, buckets, help_text in (
+        (f'{PREFIX}_duration_seconds', DURATION_BUCKETS, 'Request duration.'),
+        (f'{PREFIX}_phase_duration_seconds', DURATION_BUCKETS, 'Time spent per request in authentication, view, rendering and SQL.'),
+        (f'{PREFIX}_db_queries', QUERY_BUCKETS, 'SQL queries per request.'),
+    ):
+        lines += [f'# HELP {metric_name} {help_text}', f'# TYPE {metric_name} histogram']
+        for (name, labels), series in sorted(histograms.items()):
+            if name != metric_name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {series[-1]}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    lines += [f'# HELP {PREFIX}s_total Requests served.', f'# TYPE {PREFIX}s_total counter']
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def metrics_view(request):
+    """
+    GET metrics:
+    Request metrics of all workers in the Prometheus text format.
+    """
+    token = get_metrics_setting('TOKEN')
+    if not token:
+        # Not served at all until a token is configured
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        raise PermissionDenied
+    return HttpResponse(collect(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request: total time, time in the view and in rendering
+    (DRF responses render after the view returns), SQL queries and their
+    time, and authentication time reported by ``phase('auth')``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_metrics_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Sync hooks would be run in a worker thread on every request
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+        connection_created.connect(_install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            _install_query_recorder(connection)
+        atexit.register(registry.flush)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started()
+
+    def process_template_response(self, request, response):
+        self.view_returned()
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        self.view_returned()
+        return response
+
+    def view_started(self):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def view_returned(self):
+        # DRF responses are rendered after the view and its middleware return
+        metrics = _current.get()
+        if metrics is not None and metrics.view_started is not None:
+            metrics.render_started = time.perf_counter()
+            metrics.phases['view'] = metrics.render_started - metrics.view_started
+
+    def finish(self, request, response, metrics):
+        finished = time.perf_counter()
+        if metrics.render_started is not None:
+            metrics.phases['render'] = finished - metrics.render_started
+        elif metrics.view_started is not None:
+            metrics.phases['view'] = finished - metrics.view_started
+        total = finished - metrics.started
+
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match is not None else 'unmatched'
+        registry.record(view or 'unnamed', request.method, response.status_code, metrics, total)
+
+        if get_metrics_setting('SERVER_TIMING'):
+            timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in metrics.phases.items()]
+            timings[-1] += f';desc="{metrics.queries} queries"'
+            response['Server-Timing'] = ', '.join([f'total;dur={total * 1000:.2f}', *timings])
+        return response
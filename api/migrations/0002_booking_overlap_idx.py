@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает подтверждения'), ('approved', 'Подтверждён'), ('declined', 'Отклонён'), ('cancelled', 'Отменён')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='role',
+            field=models.CharField(choices=[('root', 'Root'), ('tenant', 'Арендатель'), ('landlord', 'Арендодатель')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['estate', 'status', 'check_in', 'check_out'], name='booking_overlap_idx'),
+        ),
+    ]
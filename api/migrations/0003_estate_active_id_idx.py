@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_booking_overlap_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['is_active', 'id'], name='estate_active_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_estate_fts USING fts5("
+            "title, description, location, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO api_estate_fts (rowid, title, description, location) '
+            'SELECT id, title, description, location FROM api_estate'
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE api_estate ADD FULLTEXT INDEX estate_fulltext_idx (title, description, location)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE api_estate_fts')
+    elif vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE api_estate DROP INDEX estate_fulltext_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_estate_active_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_searchhistory_searched_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+            ],
+            options={
+                'db_table': 'api_dailyvisitor',
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('unique_visitors', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'api_visitdailystats',
+            },
+        ),
+        migrations.AlterField(
+            model_name='visit',
+            name='visited_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['estate', 'visited_at'], name='visit_estate_time_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyvisitor',
+            name='estate',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estate'),
+        ),
+        migrations.AddField(
+            model_name='dailyvisitor',
+            name='visitor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='visitdailystats',
+            name='estate',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_visit_stats', to='api.estate'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvisitor',
+            constraint=models.UniqueConstraint(fields=('estate', 'day', 'visitor'), name='dailyvisitor_estate_day_visitor_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitdailystats',
+            constraint=models.UniqueConstraint(fields=('estate', 'day'), name='visitdailystats_estate_day_uniq'),
+        ),
+    ]
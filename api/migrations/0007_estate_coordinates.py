@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_visit_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estate',
+            name='geo_cell',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='estate',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90.0), django.core.validators.MaxValueValidator(90.0)]),
+        ),
+        migrations.AddField(
+            model_name='estate',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180.0), django.core.validators.MaxValueValidator(180.0)]),
+        ),
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['price'], name='estate_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['geo_cell'], name='estate_geo_cell_idx'),
+        ),
+    ]
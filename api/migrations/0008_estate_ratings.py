@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_ratings(apps, schema_editor):
+    Estate = apps.get_model('api', 'Estate')
+    Review = apps.get_model('api', 'Review')
+    db_alias = schema_editor.connection.alias
+    stats = (
+        Review.objects.using(db_alias).values('estate_id')
+        .annotate(total=Sum('score'), count=Count('id'))
+        .order_by()
+    )
+    Estate.objects.using(db_alias).bulk_update(
+        [
+            Estate(pk=row['estate_id'], rating_sum=row['total'], rating_count=row['count'],
+                   rating_avg=row['total'] / row['count'])
+            for row in stats
+        ],
+        ['rating_sum', 'rating_count', 'rating_avg'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_estate_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estate',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='estate',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='estate',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['rating_avg', 'id'], name='estate_rating_idx'),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_searchhistory_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstateSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('estate', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estate')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estate')),
+            ],
+            options={
+                'db_table': 'api_estatesimilarity',
+                'constraints': [models.UniqueConstraint(fields=('estate', 'rank'), name='estatesimilarity_estate_rank_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_estate_similarity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['location'], name='estate_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estate',
+            index=models.Index(fields=['title'], name='estate_title_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:50
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_occupancy(apps, schema_editor):
+    Booking = apps.get_model('api', 'Booking')
+    EstateOccupancy = apps.get_model('api', 'EstateOccupancy')
+    db_alias = schema_editor.connection.alias
+    today = timezone.localdate()
+    rows = []
+    bookings = Booking.objects.using(db_alias).filter(status__in=('pending', 'approved'), check_out__gt=today)
+    for booking in bookings.iterator(chunk_size=1000):
+        day = max(booking.check_in, today)
+        while day < booking.check_out:
+            rows.append(EstateOccupancy(estate_id=booking.estate_id, booking_id=booking.pk, day=day))
+            day += datetime.timedelta(days=1)
+    EstateOccupancy.objects.using(db_alias).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_estate_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstateOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('booking', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.booking')),
+                ('estate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estate')),
+            ],
+            options={
+                'db_table': 'api_estateoccupancy',
+                'indexes': [models.Index(fields=['day', 'estate'], name='estateoccupancy_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'day'), name='estateoccupancy_booking_day_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
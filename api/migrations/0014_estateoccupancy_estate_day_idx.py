@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_customuser_tokens_revoked_at'),
+    ]
+
+    operations = [
+        # Created first: MySQL keeps an index on the foreign key column
+        migrations.AddIndex(
+            model_name='estateoccupancy',
+            index=models.Index(fields=['estate', 'day'], name='estateoccupancy_estate_day_idx'),
+        ),
+        migrations.AlterField(
+            model_name='estateoccupancy',
+            name='estate',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estate'),
+        ),
+    ]
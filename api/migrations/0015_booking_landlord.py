@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_landlords(apps, schema_editor):
+    Booking = apps.get_model('api', 'Booking')
+    Estate = apps.get_model('api', 'Estate')
+    db_alias = schema_editor.connection.alias
+    Booking.objects.using(db_alias).update(
+        landlord_id=models.Subquery(Estate.objects.filter(pk=models.OuterRef('estate_id')).values('owner_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_estateoccupancy_estate_day_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='landlord',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_landlords, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='landlord',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['landlord', 'check_in', 'id'], name='booking_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['landlord', 'status', 'check_in', 'id'], name='booking_inbox_status_idx'),
+        ),
+    ]
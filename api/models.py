@@ -1,5 +1,9 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import geo
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
@@ -8,6 +12,8 @@ class CustomUser(AbstractUser):
         ('landlord', 'Арендодатель'),
     ]
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    # Tokens issued before this moment are rejected, see api.authentication
+    tokens_revoked_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         db_table = 'api_customuser'
@@ -19,9 +25,84 @@ class Estate(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='estates')
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)]
+    )
+    # Grid cell of the coordinates, see api.geo
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Review aggregates, kept up to date by api.ratings
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
 
     class Meta:
         db_table = 'api_estate'
+        indexes = [
+            models.Index(fields=['is_active', 'id'], name='estate_active_id_idx'),
+            # Single-column indexes: Django renders is_active=True as a bare
+            # column test, which cannot seek on an index led by is_active
+            models.Index(fields=['price'], name='estate_price_idx'),
+            # Exact filters of the estate list
+            models.Index(fields=['location'], name='estate_location_idx'),
+            models.Index(fields=['title'], name='estate_title_idx'),
+            models.Index(fields=['geo_cell'], name='estate_geo_cell_idx'),
+            # Sorting by rating, with id as the tie-breaker of the cursor
+            models.Index(fields=['rating_avg', 'id'], name='estate_rating_idx'),
+        ]
+
+    def set_geo_cell(self):
+        """
+        Recompute geo_cell from the coordinates. Called by save(); code that
+        bypasses save() (bulk_create, queryset updates) must call it itself.
+        """
+        if self.latitude is None or self.longitude is None:
+            self.geo_cell = None
+        else:
+            self.geo_cell = geo.encode(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.set_geo_cell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
+class BookingQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Update the bookings, and their occupancy rows when the fields it is
+        built from change.
+        """
+        from . import occupancy
+
+        estate = kwargs.get('estate', kwargs.get('estate_id'))
+        if estate is not None:
+            # A booking moved to another estate follows its owner
+            estate_id = estate.pk if isinstance(estate, Estate) else estate
+            kwargs['landlord_id'] = models.Subquery(
+                Estate.objects.filter(pk=estate_id).values('owner_id')[:1]
+            )
+        if not kwargs.keys() & occupancy.BOOKING_FIELDS:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            # Selected first: the update may change what the filters match
+            ids = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            bookings = Booking.objects.using(self.db).filter(pk__in=ids).only(*occupancy.BOOKING_FIELDS)
+            occupancy.sync_bookings(list(bookings), using=self.db)
+        return updated
+
+    def overlapping(self, estate, check_in, check_out):
+        # Two stays overlap when each one starts before the other one ends
+        return self.filter(
+            estate=estate,
+            status__in=Booking.BLOCKING_STATUSES,
+            check_in__lt=check_out,
+            check_out__gt=check_in,
+        )
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -30,14 +111,66 @@ class Booking(models.Model):
         ('declined', 'Отклонён'),
         ('cancelled', 'Отменён'),
     ]
+    # Bookings in these statuses hold the estate for their dates
+    BLOCKING_STATUSES = ('pending', 'approved')
+
     estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='bookings')
     tenant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='bookings')
+    # The estate's owner, copied so that the landlord's inbox is read in
+    # check-in order from one index across all of their estates. Indexed by
+    # booking_inbox_idx.
+    landlord = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='+', editable=False, db_index=False,
+    )
     check_in = models.DateField()
     check_out = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         db_table = 'api_booking'
+        indexes = [
+            models.Index(fields=['estate', 'status', 'check_in', 'check_out'], name='booking_overlap_idx'),
+            # The landlord's inbox, in its keyset order, with or without a status
+            models.Index(fields=['landlord', 'check_in', 'id'], name='booking_inbox_idx'),
+            models.Index(fields=['landlord', 'status', 'check_in', 'id'], name='booking_inbox_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if Booking.estate.is_cached(self):
+            self.landlord_id = self.estate.owner_id
+        elif self.landlord_id is None:
+            self.landlord_id = Estate.objects.filter(pk=self.estate_id).values_list('owner_id', flat=True).first()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'estate' in set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'landlord'}
+        super().save(*args, **kwargs)
+
+class EstateOccupancy(models.Model):
+    """
+    A night an estate is held by a pending or approved booking, from today
+    on, kept in step with the bookings by api.occupancy. Availability
+    searches read the nights of the requested stay instead of every booking.
+    """
+    # Indexed by estateoccupancy_estate_day_idx
+    estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='+', db_index=False)
+    # Indexed by estateoccupancy_booking_day_uniq
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='+', db_index=False)
+    day = models.DateField()
+
+    class Meta:
+        db_table = 'api_estateoccupancy'
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'day'], name='estateoccupancy_booking_day_uniq'),
+        ]
+        indexes = [
+            # Whether an estate is held on one of the nights of a stay, from
+            # the index alone
+            models.Index(fields=['estate', 'day'], name='estateoccupancy_estate_day_idx'),
+            # The nights before a day, for the pruning
+            models.Index(fields=['day', 'estate'], name='estateoccupancy_day_idx'),
+        ]
 
 class Review(models.Model):
     estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='reviews')
@@ -52,15 +185,75 @@ class Review(models.Model):
 class Visit(models.Model):
     estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='visits')
     visitor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='visits')
-    visited_at = models.DateTimeField(auto_now_add=True)
+    # Set when the visit happens, not when the buffered row is written
+    visited_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'api_visit'
+        indexes = [
+            models.Index(fields=['estate', 'visited_at'], name='visit_estate_time_idx'),
+        ]
+
+class VisitDailyStats(models.Model):
+    """
+    Per-estate, per-day visit rollup, updated incrementally as visits are ingested.
+    """
+    estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='daily_visit_stats')
+    day = models.DateField()
+    visits = models.PositiveIntegerField(default=0)
+    unique_visitors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'api_visitdailystats'
+        constraints = [
+            models.UniqueConstraint(fields=['estate', 'day'], name='visitdailystats_estate_day_uniq'),
+        ]
+
+class DailyVisitor(models.Model):
+    """
+    Visitors already counted in VisitDailyStats.unique_visitors for an estate and day.
+    """
+    estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='+')
+    visitor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+
+    class Meta:
+        db_table = 'api_dailyvisitor'
+        constraints = [
+            models.UniqueConstraint(fields=['estate', 'day', 'visitor'], name='dailyvisitor_estate_day_visitor_uniq'),
+        ]
+
+class EstateSimilarity(models.Model):
+    """
+    Precomputed neighbours of an estate, most similar first, built from
+    co-visits and estate attributes by api.similarity.
+    """
+    # Indexed by estatesimilarity_estate_rank_uniq
+    estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='+', db_index=False)
+    similar = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'api_estatesimilarity'
+        constraints = [
+            models.UniqueConstraint(fields=['estate', 'rank'], name='estatesimilarity_estate_rank_uniq'),
+        ]
 
 class SearchHistory(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='search_history')
+    # Indexed by searchhistory_user_time_idx
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='search_history', db_index=False)
     query = models.TextField()
-    searched_at = models.DateTimeField(auto_now_add=True)
+    # Set when the search happens, not when the buffered row is written; for
+    # repeated searches, the time of the last one
+    searched_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Identical consecutive searches are stored once (see api.history)
+    hits = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         db_table = 'api_searchhistory'
+        indexes = [
+            # A user's history, newest first, and the retention cut-off
+            models.Index(fields=['user', 'searched_at', 'id'], name='searchhistory_user_time_idx'),
+        ]
@@ -0,0 +1,112 @@
+"""
+Per-night occupancy of the estates, for availability searches.
+
+EstateOccupancy holds a row for every night, from today on, that a pending
+or approved booking holds its estate. Whether an estate is free for a stay
+is then one seek of the (estate, day) index for a row on one of its nights,
+whatever the size of the booking history. Nights before today are never
+written and are deleted by ``prune_occupancy()``.
+
+Bookings are synced by the Booking post_save signal and by the updates of
+Booking querysets, and their rows are deleted with them by the foreign key
+cascade. Code that bypasses these (bulk_create, raw SQL) must call
+``sync_bookings()``, or ``rebuild_occupancy()`` afterwards.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import bump_occupancy_version
+from .models import Booking, EstateOccupancy
+
+# Longest stay an availability search may ask for
+MAX_STAY_DAYS = 365
+BATCH_SIZE = 1000
+# The Booking fields the occupancy rows are built from
+BOOKING_FIELDS = {'estate', 'estate_id', 'check_in', 'check_out', 'status'}
+
+
+def booking_nights(booking, today):
+    """
+    The nights from today on for which the booking holds its estate.
+    """
+    if booking.status not in Booking.BLOCKING_STATUSES:
+        return []
+    # Instances created with ISO strings keep them after save()
+    to_date = Booking._meta.get_field('check_in').to_python
+    day, check_out = max(to_date(booking.check_in), today), to_date(booking.check_out)
+    nights = []
+    while day < check_out:
+        nights.append(day)
+        day += datetime.timedelta(days=1)
+    return nights
+
+
+def sync_bookings(bookings, using='default', created=False):
+    """
+    Replace the occupancy rows of the given bookings. ``created`` skips the
+    deletion for bookings that cannot have rows yet.
+    """
+    today = timezone.localdate()
+    with transaction.atomic(using=using):
+        if not created:
+            EstateOccupancy.objects.using(using).filter(booking__in=[booking.pk for booking in bookings]).delete()
+        EstateOccupancy.objects.using(using).bulk_create(
+            [
+                EstateOccupancy(estate_id=booking.estate_id, booking_id=booking.pk, day=day)
+                for booking in bookings
+                for day in booking_nights(booking, today)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    transaction.on_commit(bump_occupancy_version, using=using)
+
+
+def rebuild_occupancy(using='default'):
+    """
+    Recreate the whole table from the bookings. Returns the number of rows.
+    """
+    today = timezone.localdate()
+    bookings = (
+        Booking.objects.using(using)
+        .filter(status__in=Booking.BLOCKING_STATUSES, check_out__gt=today)
+        .only('id', 'estate_id', 'check_in', 'check_out', 'status')
+    )
+    total = 0
+    with transaction.atomic(using=using):
+        EstateOccupancy.objects.using(using).all().delete()
+        batch = []
+        for booking in bookings.iterator(chunk_size=BATCH_SIZE):
+            batch += [
+                EstateOccupancy(estate_id=booking.estate_id, booking_id=booking.pk, day=day)
+                for day in booking_nights(booking, today)
+            ]
+            if len(batch) >= BATCH_SIZE:
+                EstateOccupancy.objects.using(using).bulk_create(batch)
+                total += len(batch)
+                batch = []
+        EstateOccupancy.objects.using(using).bulk_create(batch)
+        total += len(batch)
+    transaction.on_commit(bump_occupancy_version, using=using)
+    return total
+
+
+def prune_occupancy(using='default'):
+    """
+    Delete the nights before today. Returns the number of rows deleted.
+    """
+    deleted, _ = EstateOccupancy.objects.using(using).filter(day__lt=timezone.localdate()).delete()
+    return deleted
+
+
+def filter_available(queryset, check_in, check_out):
+    """
+    Keep the estates of ``queryset`` that are free every night from
+    ``check_in`` to the night before ``check_out``.
+    """
+    # Correlated on the estate, so that each estate the list reaches costs
+    # one index seek, instead of a list of every estate held on these nights
+    occupied = EstateOccupancy.objects.filter(estate=OuterRef('pk'), day__gte=check_in, day__lt=check_out)
+    return queryset.filter(~Exists(occupied))
@@ -0,0 +1,120 @@
+"""
+Estate writes restricted to the estates of the requesting landlord.
+
+The statements themselves carry the ownership check (``UPDATE ... WHERE id
+AND owner_id``), instead of a read of the estate followed by a write, so
+there is nothing to race with and no extra query. Only when nothing matched
+is the estate looked up, to answer 404 or 403.
+
+Queryset updates skip save() and the Estate signals; ``update_estates()``
+does their work: the geo cell, the search index and the cached responses.
+``delete_estates()`` likewise deletes the rows referencing the estates with
+one statement per table, instead of the collector's reads of every related
+row, and then the estates.
+"""
+from contextlib import nullcontext
+
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.http import Http404
+
+from . import search
+from .cache import bump_estate_versions
+from .models import (
+    Booking, DailyVisitor, Estate, EstateOccupancy, EstateSimilarity, Review, Visit, VisitDailyStats,
+)
+
+# The rows deleted along with an estate, as (model, field referencing it),
+# those referencing other rows of the list first
+ESTATE_DEPENDENTS = (
+    (EstateOccupancy, 'estate'),
+    (Booking, 'estate'),
+    (Review, 'estate'),
+    (Visit, 'estate'),
+    (VisitDailyStats, 'estate'),
+    (DailyVisitor, 'estate'),
+    (EstateSimilarity, 'estate'),
+    (EstateSimilarity, 'similar'),
+)
+
+
+def update_estates(queryset, ids, fields):
+    """
+    Set ``fields`` on the estates of ``queryset`` (the estates ``ids``, or
+    some of them) with one UPDATE statement. A single coordinate is paired
+    with each estate's stored one. Returns the number of updated estates.
+    """
+    if not fields:
+        return 0
+    fields = dict(fields)
+    single = ('latitude' in fields) != ('longitude' in fields)
+    if 'latitude' in fields and 'longitude' in fields:
+        estate = Estate(latitude=fields['latitude'], longitude=fields['longitude'])
+        estate.set_geo_cell()
+        fields['geo_cell'] = estate.geo_cell
+    reindex = bool(fields.keys() & set(search.SEARCH_FIELDS))
+    # The search index is written along with the row, and the stored
+    # coordinates are read under the lock of the rows
+    with transaction.atomic(using=queryset.db) if reindex or single else nullcontext():
+        if single:
+            fields['geo_cell'] = _geo_cells(queryset, fields)
+        updated = queryset.update(**fields)
+        if updated and reindex:
+            search.reindex_estates(ids, using=queryset.db)
+    if updated:
+        transaction.on_commit(lambda: bump_estate_versions(ids), using=queryset.db)
+    return updated
+
+
+def _geo_cells(queryset, fields):
+    """
+    An expression giving each estate of ``queryset`` the geo cell of the one
+    coordinate in ``fields`` and its other, stored coordinate.
+    """
+    given, stored = ('latitude', 'longitude') if 'latitude' in fields else ('longitude', 'latitude')
+    cells = []
+    for pk, value in queryset.select_for_update().values_list('pk', stored):
+        estate = Estate(**{given: fields[given], stored: value})
+        estate.set_geo_cell()
+        cells.append(When(pk=pk, then=Value(estate.geo_cell, output_field=Estate._meta.get_field('geo_cell'))))
+    return Case(*cells, default=F('geo_cell')) if cells else F('geo_cell')
+
+
+def delete_estates(queryset, ids):
+    """
+    Delete the estates of ``queryset`` (the estates ``ids``, or some of them)
+    and the rows referencing them, with one DELETE statement per table.
+    Returns the number of deleted estates.
+    """
+    using = queryset.db
+    estates = queryset.values('pk')
+    with transaction.atomic(using=using):
+        for model, field in ESTATE_DEPENDENTS:
+            # No row of these tables has dependents of its own left to collect
+            dependents = model._base_manager.using(using).filter(**{f'{field}__in': estates})
+            dependents._raw_delete(using)
+        deleted = queryset._raw_delete(using)
+        if deleted:
+            search.remove_estates(ids, using=using)
+    if deleted:
+        transaction.on_commit(lambda: bump_estate_versions(ids), using=using)
+    return deleted
+
+
+class OwnedEstateMixin:
+    """
+    Views writing to estates of the requesting user, through querysets
+    limited to them.
+    """
+
+    def get_queryset(self):
+        return Estate.objects.filter(owner_id=self.request.user.id)
+
+    def ownership_error(self, pk):
+        """
+        The error for an estate the owned queryset did not match.
+        """
+        if Estate.objects.filter(pk=pk).exists():
+            return PermissionDenied("You are not the owner of this estate.")
+        return Http404('No Estate matches the given query.')
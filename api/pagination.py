@@ -0,0 +1,209 @@
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+
+# Joins the ordering field and the tie-breaker of a cursor position
+POSITION_SEPARATOR = '|'
+
+
+class AsyncCursorPagination(CursorPagination):
+    """
+    Cursor pagination that can also fetch its page with the async ORM.
+
+    ``paginate_queryset()`` is DRF's implementation split in two around the
+    single query it runs, so that ``apaginate_queryset()`` can share the rest.
+    A second ordering field, in the same direction as the first, is used as a
+    tie-breaker in the cursor position.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        # Cursor pagination always enforces an ordering.
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # If we have a cursor with a fixed position then filter by that.
+        if current_position is not None:
+            queryset = queryset.filter(self.get_position_filter(current_position))
+
+        # If we have an offset cursor then offset the entire page by that amount.
+        # We also always fetch an extra item in order to determine if there is a
+        # page following on from this one.
+        return queryset[offset:offset + self.page_size + 1]
+
+    def get_position_filter(self, position):
+        order = self.ordering[0]
+        is_reversed = order.startswith('-')
+        order_attr = order.lstrip('-')
+
+        # Test for: (cursor reversed) XOR (queryset reversed)
+        lookup = 'lt' if self.cursor.reverse != is_reversed else 'gt'
+        if len(self.ordering) == 1:
+            return Q(**{f'{order_attr}__{lookup}': position})
+
+        # With a tie-breaker the position is a pair of values, compared as a
+        # tuple. The redundant first condition lets the database seek the index.
+        try:
+            value, tie_value = position.rsplit(POSITION_SEPARATOR, 1)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        tie_attr = self.ordering[1].lstrip('-')
+        return Q(**{f'{order_attr}__{lookup}e': value}) & (
+            Q(**{f'{order_attr}__{lookup}': value}) | Q(**{f'{tie_attr}__{lookup}': tie_value})
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        # A unique tie-breaker after the ordering field makes every position
+        # unique, so pages never fall back to offsets within equal values
+        position = super()._get_position_from_instance(instance, ordering)
+        if len(ordering) > 1:
+            tie_position = super()._get_position_from_instance(instance, ordering[1:])
+            position = f'{position}{POSITION_SEPARATOR}{tie_position}'
+        return position
+
+    def set_page(self, results):
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        self.page = list(results[:self.page_size])
+
+        # Determine the position of the final item following the page.
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # If we have a reverse queryset, then the query ordering was in reverse
+            # so we need to reverse the items again before returning them to the user.
+            self.page = list(reversed(self.page))
+
+            # Determine next and previous positions for reverse cursors.
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            # Determine next and previous positions for forward cursors.
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        # Display page controls in the browsable API if there is more
+        # than one page.
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination that can also fetch its page with the async ORM.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Fill the paginator's cached count so that it never counts synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        self.page.object_list = [obj async for obj in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            # The browsable API should display pagination controls.
+            self.display_page_controls = True
+
+        return list(self.page)
+
+
+class EstateCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pagination over the (is_active, id) index of the estate table, or
+    over the index of the field chosen with the `ordering` parameter.
+    """
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SearchHistoryCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pagination over a user's history, newest first, along the
+    (user, searched_at, id) index.
+    """
+    ordering = ('-searched_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class BookingInboxCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pagination over the bookings of a landlord's estates, by check-in
+    date.
+    """
+    ordering = ('check_in', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class EstateSearchPagination(AsyncPageNumberPagination):
+    """
+    Page-number pagination for relevance-ranked search results, which have no
+    unique ordering key to build a cursor from.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,65 @@
+"""
+Incremental maintenance of the review aggregates stored on Estate.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast
+
+from .models import Estate, Review
+
+RATING_FIELDS = ['rating_sum', 'rating_count', 'rating_avg']
+
+
+def add_score(estate_id, score):
+    """
+    Count a new review score in the rating aggregates of an estate.
+
+    A single UPDATE computes the new values from the stored ones, so
+    concurrent reviews never overwrite each other.
+    """
+    Estate.objects.filter(pk=estate_id).update(
+        # Listed first: MySQL applies SET assignments left to right, and later
+        # ones would see the already incremented sum and count
+        rating_avg=Cast(F('rating_sum') + score, FloatField()) / (F('rating_count') + 1),
+        rating_sum=F('rating_sum') + score,
+        rating_count=F('rating_count') + 1,
+    )
+
+
+def rebuild_ratings(batch_size=1000):
+    """
+    Recompute the rating aggregates of all estates from the review table.
+    Returns the ids of the estates whose stored aggregates were wrong.
+    """
+    repaired = []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # Lock the batch so that reviews created meanwhile wait for it
+            # instead of being overwritten
+            estates = list(
+                Estate.objects.select_for_update()
+                .filter(pk__gt=last_id)
+                .order_by('pk')
+                .only('pk', *RATING_FIELDS)[:batch_size]
+            )
+            if not estates:
+                break
+            last_id = estates[-1].pk
+            stats = {
+                row['estate_id']: row
+                for row in Review.objects.filter(estate_id__in=[estate.pk for estate in estates])
+                .values('estate_id')
+                .annotate(total=Sum('score'), count=Count('id'))
+                .order_by()
+            }
+            changed = []
+            for estate in estates:
+                row = stats.get(estate.pk, {'total': 0, 'count': 0})
+                values = (row['total'], row['count'], row['total'] / row['count'] if row['count'] else 0)
+                if (estate.rating_sum, estate.rating_count, estate.rating_avg) != values:
+                    estate.rating_sum, estate.rating_count, estate.rating_avg = values
+                    changed.append(estate)
+            Estate.objects.bulk_update(changed, RATING_FIELDS)
+        repaired.extend(estate.pk for estate in changed)
+    return repaired
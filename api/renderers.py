@@ -0,0 +1,41 @@
+"""
+JSON rendering with orjson, byte for byte identical to DRF's JSONRenderer.
+
+orjson differs from the json module in a few representations, which are
+worked around or detected:
+- Floats below 1e-4 or from 1e16 are written with an exponent by Python
+  (``1e-05``, ``1e+16``) but not always by orjson (``0.00001``, ``1e16``).
+  Output holding such a number is rendered again with the json module.
+- U+2028 and U+2029, escaped by DRF, are escaped after rendering.
+- Types orjson does not know, and dates and times, go through DRF's encoder.
+- Integers beyond 64 bits fail in orjson and are rendered with the json module.
+Indented output (``Accept: application/json; indent=4``) and non-default
+UNICODE_JSON or COMPACT_JSON settings use the json module as well. NaN and
+infinities render as null instead of failing.
+"""
+import re
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+# A number token in exponent form, or below 1e-4 without one
+_PYTHON_FLOAT_FORMATS = re.compile(
+    rb'[:,\[]-?[0-9]+(?:\.[0-9]+)?e-?[0-9]+[,\]}]|[:,\[]-?0\.0000[0-9]*[,\]}]'
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _PYTHON_FLOAT_FORMATS.search(content):
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,115 @@
+"""
+Incremental maintenance of the per-estate, per-day visit rollups.
+"""
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import DailyVisitor, Visit, VisitDailyStats
+
+
+def apply_visits(visits):
+    """
+    Add a batch of new Visit instances to VisitDailyStats.
+    """
+    visit_counts = Counter()
+    visitors = defaultdict(set)
+    for visit in visits:
+        key = (visit.estate_id, timezone.localdate(visit.visited_at))
+        visit_counts[key] += 1
+        visitors[key].add(visit.visitor_id)
+    if not visit_counts:
+        return
+
+    # Leave out the visitors already counted for their estate and day, which
+    # are most of them, before inserting the others one by one
+    estate_ids = {estate_id for estate_id, _ in visit_counts}
+    days = {day for _, day in visit_counts}
+    visitor_ids = set().union(*visitors.values())
+    seen = set(
+        DailyVisitor.objects.filter(estate_id__in=estate_ids, day__in=days, visitor_id__in=visitor_ids)
+        .values_list('estate_id', 'day', 'visitor_id')
+    )
+    new_visitors = [
+        DailyVisitor(estate_id=estate_id, day=day, visitor_id=visitor_id)
+        for (estate_id, day), day_visitors in visitors.items()
+        for visitor_id in day_visitors
+        if (estate_id, day, visitor_id) not in seen
+    ]
+
+    with transaction.atomic():
+        new_unique = _insert_visitors(new_visitors)
+        VisitDailyStats.objects.bulk_create(
+            [VisitDailyStats(estate_id=estate_id, day=day) for estate_id, day in visit_counts],
+            ignore_conflicts=True,
+        )
+        for (estate_id, day), count in visit_counts.items():
+            VisitDailyStats.objects.filter(estate_id=estate_id, day=day).update(
+                visits=F('visits') + count,
+                unique_visitors=F('unique_visitors') + new_unique[(estate_id, day)],
+            )
+
+
+def _insert_visitors(visitors):
+    """
+    Insert the DailyVisitor rows that do not exist yet. Returns the number
+    inserted per (estate, day).
+
+    The rows are inserted one at a time so that unique_visitors grows only by
+    the rows this call actually inserted: another worker flushing the same
+    visitor concurrently can be missed by the ``seen`` query, and only one of
+    the two inserts then takes effect.
+    """
+    ops = connection.ops
+    fields = [DailyVisitor._meta.get_field(name) for name in ('estate', 'day', 'visitor')]
+    sql = ' '.join(filter(None, [
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        '%s (%s) VALUES (%%s, %%s, %%s)' % (
+            ops.quote_name(DailyVisitor._meta.db_table),
+            ', '.join(ops.quote_name(field.column) for field in fields),
+        ),
+        ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    ]))
+    inserted = Counter()
+    with connection.cursor() as cursor:
+        for visitor in visitors:
+            cursor.execute(sql, (visitor.estate_id, ops.adapt_datefield_value(visitor.day), visitor.visitor_id))
+            if cursor.rowcount > 0:
+                inserted[(visitor.estate_id, visitor.day)] += 1
+    return inserted
+
+
+def rebuild_visit_stats(batch_size=1000):
+    """
+    Recompute all rollups from the raw visit table.
+    """
+    with transaction.atomic():
+        VisitDailyStats.objects.all().delete()
+        DailyVisitor.objects.all().delete()
+        visitors = (
+            Visit.objects.values('estate_id', 'visitor_id', day=F('visited_at__date'))
+            .distinct()
+            .order_by()
+        )
+        _bulk_create_chunked(
+            DailyVisitor, (DailyVisitor(**row) for row in visitors.iterator(chunk_size=batch_size)), batch_size
+        )
+        stats = (
+            Visit.objects.values('estate_id', day=F('visited_at__date'))
+            .annotate(visits=Count('id'), unique_visitors=Count('visitor_id', distinct=True))
+            .order_by()
+        )
+        _bulk_create_chunked(
+            VisitDailyStats, (VisitDailyStats(**row) for row in stats.iterator(chunk_size=batch_size)), batch_size
+        )
+
+
+def _bulk_create_chunked(model, objs, batch_size):
+    # bulk_create() materializes its input, so feed it one chunk at a time
+    objs = iter(objs)
+    while chunk := list(islice(objs, batch_size)):
+        model.objects.bulk_create(chunk)
@@ -0,0 +1,142 @@
+"""
+Read replica routing.
+
+When a ``replica`` database is configured, GET requests to views using
+``ReplicaReadMixin`` read from it; everything else, and every write, uses
+the primary (``default``). The choice is held in a context variable that
+``ReplicaRoutingMiddleware`` resets around each request, so it follows
+async views into their ORM threads and never leaks into the next request.
+
+Replicas lag behind the primary, so reads stay on the primary:
+- for ``REPLICA_PIN_SECONDS`` after the requesting user wrote anything
+  (read-your-writes), tracked with a key in the shared cache;
+- inside transactions on the primary;
+- when a cached response is rebuilt for data changed less than
+  ``REPLICA_PIN_SECONDS`` ago, which would otherwise cache a stale copy.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def _pin_cache_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """
+    Serve the user's reads from the primary until the replica has caught up.
+    """
+    cache.set(_pin_cache_key(user_id), 1, get_pin_seconds())
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(_pin_cache_key(user_id)) is not None
+
+
+def use_replica():
+    _use_replica.set(True)
+
+
+def use_primary():
+    _use_replica.set(False)
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica when the current request allows it.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema from the primary
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Read from the replica for safe requests, unless the user wrote recently.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS or not replica_configured():
+            return
+        if request.user.is_authenticated and is_pinned_to_primary(request.user.id):
+            return
+        use_replica()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope replica routing to one request, and pin users who wrote something
+    to the primary for a while.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    def pin_writer(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        # DRF copies the authenticated user to the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
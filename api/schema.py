@@ -0,0 +1,143 @@
+"""
+The OpenAPI schema, generated once and served as it is.
+
+Generating the schema walks every view and serializer, which costs tens of
+milliseconds and a few megabytes on each request of SpectacularAPIView.
+``manage.py build_schema`` (run when the image is built) writes it instead to
+``API_DOCS['SCHEMA_DIR']``, in YAML and JSON, each also gzipped, and
+``schema_view`` serves those files with an ETag, so clients revalidate with
+a 304 and the gzipped body is sent as it is. Without the files, or with
+DEBUG, the schema is generated on the first request of each worker and kept
+in memory.
+
+Only imported when ``API_DOCS['ENABLED']`` is on (see api/docs.py).
+"""
+import gzip
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_safe
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+from .docs import get_docs_setting
+
+# Renderer of each format, as SpectacularAPIView renders it
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+# Media types accepted for each format, the first one being the default
+MEDIA_TYPES = {
+    'yaml': ('application/vnd.oai.openapi', 'application/yaml'),
+    'json': ('application/vnd.oai.openapi+json', 'application/json'),
+}
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+_schema = {}
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    # ClaimsJWTAuthentication reads the same bearer token as the JWTAuthentication it extends
+    target_class = 'api.authentication.ClaimsJWTAuthentication'
+
+
+class SchemaFile:
+    """
+    A rendered schema, its gzipped copy and its ETag.
+    """
+
+    def __init__(self, content, gzipped=None):
+        self.content = content
+        self.gzipped = gzipped if gzipped is not None else compress(content)
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def compress(content):
+    # Without a timestamp, so that the same schema always gives the same file
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def generate_schema():
+    """
+    Render the schema in every format: {format: bytes}.
+    """
+    schema = SchemaGenerator().get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+    return {schema_format: renderer().render(schema, renderer_context={}) for schema_format, renderer in RENDERERS.items()}
+
+
+def schema_path(schema_format, gzipped=False):
+    return os.path.join(get_docs_setting('SCHEMA_DIR'), f'schema.{schema_format}' + ('.gz' if gzipped else ''))
+
+
+def read_schema():
+    """
+    The schema files written by build_schema, or None if any is missing.
+    """
+    files = {}
+    for schema_format in RENDERERS:
+        try:
+            with open(schema_path(schema_format), 'rb') as f:
+                content = f.read()
+            with open(schema_path(schema_format, gzipped=True), 'rb') as f:
+                gzipped = f.read()
+        except OSError:
+            return None
+        files[schema_format] = SchemaFile(content, gzipped)
+    return files
+
+
+def get_schema():
+    if not _schema:
+        files = None
+        if get_docs_setting('SCHEMA_DIR') and not settings.DEBUG:
+            files = read_schema()
+        if files is None:
+            files = {schema_format: SchemaFile(content) for schema_format, content in generate_schema().items()}
+        _schema.update(files)
+    return _schema
+
+
+def negotiate(request):
+    """
+    The format and media type of the response: the ``format`` query
+    parameter, or the first known media type in the Accept header.
+    """
+    schema_format = request.GET.get('format')
+    if schema_format in MEDIA_TYPES:
+        return schema_format, MEDIA_TYPES[schema_format][0]
+    accept = request.headers.get('Accept', '')
+    for media_type in (media_type.split(';')[0].strip() for media_type in accept.split(',')):
+        for schema_format, media_types in MEDIA_TYPES.items():
+            if media_type in media_types:
+                return schema_format, media_type
+    return 'yaml', MEDIA_TYPES['yaml'][0]
+
+
+@require_safe
+def schema_view(request):
+    """
+    GET schema:
+    The OpenAPI schema, in YAML (default) or JSON.
+    """
+    schema_format, media_type = negotiate(request)
+    schema = get_schema()[schema_format]
+    if RENDERERS[schema_format].charset:
+        media_type += f'; charset={RENDERERS[schema_format].charset}'
+
+    if _ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+        response = HttpResponse(schema.gzipped, content_type=media_type)
+        response['Content-Encoding'] = 'gzip'
+        response['ETag'] = schema.etag[:-1] + '-gzip"'
+    else:
+        response = HttpResponse(schema.content, content_type=media_type)
+        response['ETag'] = schema.etag
+    response['Content-Disposition'] = f'inline; filename="{spectacular_settings.TITLE or "schema"}.{schema_format}"'
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return get_conditional_response(request, etag=response['ETag'], response=response)
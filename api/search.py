@@ -0,0 +1,126 @@
+"""
+Full-text search over estate title, description and location.
+
+SQLite keeps a separate FTS5 table (``api_estate_fts``) whose rowid is the
+estate id. It is written from the Estate signal handlers and by code paths
+that bypass signals (bulk inserts, queryset updates). MySQL uses a FULLTEXT
+index on ``api_estate`` itself, which the server keeps up to date.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'api_estate_fts'
+MYSQL_FULLTEXT_INDEX = 'estate_fulltext_idx'
+SEARCH_FIELDS = ('title', 'description', 'location')
+
+# bm25() weights for title, description and location
+SQLITE_RANK_WEIGHTS = (3.0, 1.0, 2.0)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query)
+
+
+def _sqlite_match_expression(terms):
+    # Quote every term so that user input cannot inject FTS5 query syntax, and
+    # match on prefixes so that partially typed words still find results.
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+def search_estates(queryset, query):
+    """
+    Restrict ``queryset`` to estates matching ``query`` and order them by
+    relevance. The score is exposed as the ``search_rank`` annotation.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = _sqlite_match_expression(terms)
+        weights = ', '.join(str(weight) for weight in SQLITE_RANK_WEIGHTS)
+        # Join the index once: a subquery per row would run the MATCH again
+        # for every candidate estate
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = api_estate.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(
+            # bm25() is lower for better matches, so flip the sign
+            search_rank=RawSQL(f'-bm25({FTS_TABLE}, {weights})', (), output_field=FloatField())
+        )
+    elif vendor == 'mysql':
+        columns = ', '.join(f'api_estate.{field}' for field in SEARCH_FIELDS)
+        queryset = queryset.annotate(
+            search_rank=RawSQL(
+                f'MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)',
+                (' '.join(terms),),
+                output_field=FloatField(),
+            )
+        ).filter(search_rank__gt=0)
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term) | Q(location__icontains=term)
+        queryset = queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_rank', 'id')
+
+
+def index_estates(estates, using='default'):
+    """
+    Add or refresh the index entries of the given Estate instances.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    rows = [(estate.pk, estate.title, estate.description, estate.location) for estate in estates]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def reindex_estates(ids, using='default'):
+    """
+    Refresh the index entries of the estates with the given ids from the database.
+    """
+    from .models import Estate
+
+    if connections[using].vendor != 'sqlite':
+        return
+    ids = list(ids)
+    estates = Estate.objects.using(using).filter(pk__in=ids).only('id', *SEARCH_FIELDS)
+    remove_estates(ids, using=using)
+    index_estates(estates, using=using)
+
+
+def remove_estates(ids, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+
+def rebuild_index(using='default'):
+    """
+    Recreate the whole index from the estate table.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+                f'SELECT id, title, description, location FROM api_estate'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif connection.vendor == 'mysql':
+            cursor.execute('OPTIMIZE TABLE api_estate')
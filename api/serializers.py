@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from .models import Estate, Booking, Review, Visit, SearchHistory
+from .models import Estate, EstateSimilarity, Booking, Review, Visit, VisitDailyStats, SearchHistory
 
 User = get_user_model()
 
@@ -22,27 +22,56 @@ class EstateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Estate
         fields = [
-            'id', 'title', 'description', 'location', 'price', 'is_active', 'owner'
+            'id', 'title', 'description', 'location', 'price', 'is_active', 'owner',
+            'latitude', 'longitude', 'rating_avg', 'rating_count',
         ]
-        read_only_fields = ['owner']
+        read_only_fields = ['owner', 'rating_avg', 'rating_count']
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Latitude and longitude must be set together.")
+        return attrs
 
     def to_representation(self, instance):
         # Customize the output representation to include the owner's ID
+        # without loading the related user row, as the list fast path
+        # (api.fastpath) does
         representation = super().to_representation(instance)
-        representation['owner'] = instance.owner.id
+        representation['owner'] = instance.owner_id
         return representation
 
+class SimilarEstateSerializer(serializers.ModelSerializer):
+    estate = EstateSerializer(source='similar')
+
+    class Meta:
+        model = EstateSimilarity
+        fields = ['estate', 'score']
+
 class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['id', 'estate', 'check_in', 'check_out', 'status']
 
+    def validate(self, attrs):
+        if attrs['check_in'] >= attrs['check_out']:
+            raise serializers.ValidationError("Check-out date must be after check-in date.")
+        return attrs
+
     def to_representation(self, instance):
         # Customize the output representation to include the tenant's ID
         representation = super().to_representation(instance)
-        representation['tenant'] = instance.tenant.id
+        representation['tenant'] = instance.tenant_id
         return representation
 
+class BookingInboxSerializer(BookingSerializer):
+    estate_title = serializers.CharField(source='estate.title', read_only=True)
+    tenant_username = serializers.CharField(source='tenant.username', read_only=True)
+
+    class Meta(BookingSerializer.Meta):
+        fields = BookingSerializer.Meta.fields + ['estate_title', 'tenant_username']
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -51,7 +80,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         # Customize the output representation to include the reviewer's ID
         representation = super().to_representation(instance)
-        representation['reviewer'] = instance.reviewer.id
+        representation['reviewer'] = instance.tenant_id
         return representation
 
 class VisitSerializer(serializers.ModelSerializer):
@@ -59,7 +88,34 @@ class VisitSerializer(serializers.ModelSerializer):
         model = Visit
         fields = '__all__'
 
+class VisitDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VisitDailyStats
+        fields = ['estate', 'day', 'visits', 'unique_visitors']
+
 class SearchHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = SearchHistory
         fields = '__all__'
+
+class EstateBulkUpdateListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        ids = [item['id'] for item in attrs]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Each estate can be listed only once.")
+        return attrs
+
+class EstateBulkUpdateSerializer(serializers.ModelSerializer):
+    # Selects the estate to update, so it is writable here
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = Estate
+        fields = ['id', 'price', 'is_active']
+        extra_kwargs = {'price': {'required': False}, 'is_active': {'required': False}}
+        list_serializer_class = EstateBulkUpdateListSerializer
+
+    def validate(self, attrs):
+        if attrs.keys() == {'id'}:
+            raise serializers.ValidationError("Set the price, is_active or both.")
+        return attrs
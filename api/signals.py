@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import occupancy, search
+from .authentication import forget_cached_user, revoke_user_tokens
+from .cache import bump_estate_versions, bump_occupancy_version
+from .models import Booking, CustomUser, Estate
+
+# Changing any of these makes the claims of already issued tokens wrong
+TOKEN_CLAIM_FIELDS = ('role', 'is_active', 'password')
+
+
+@receiver(post_save, sender=Estate)
+def estate_saved(sender, instance, using, **kwargs):
+    search.index_estates([instance], using=using)
+    transaction.on_commit(lambda: bump_estate_versions([instance.pk]), using=using)
+
+
+@receiver(post_delete, sender=Estate)
+def estate_deleted(sender, instance, using, **kwargs):
+    search.remove_estates([instance.pk], using=using)
+    transaction.on_commit(lambda: bump_estate_versions([instance.pk]), using=using)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, using, **kwargs):
+    occupancy.sync_bookings([instance], using=using, created=created)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, using, **kwargs):
+    # The occupancy rows are deleted by the cascade
+    transaction.on_commit(bump_occupancy_version, using=using)
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_changing(sender, instance, raw, using, **kwargs):
+    if raw or instance.pk is None:
+        return
+    previous = CustomUser.objects.using(using).filter(pk=instance.pk).values(*TOKEN_CLAIM_FIELDS).first()
+    instance._revoke_tokens = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in TOKEN_CLAIM_FIELDS
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, using, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        transaction.on_commit(lambda: revoke_user_tokens(instance.pk), using=using)
+    else:
+        transaction.on_commit(lambda: forget_cached_user(instance.pk), using=using)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: revoke_user_tokens(instance.pk), using=using)
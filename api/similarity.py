@@ -0,0 +1,294 @@
+"""
+Offline computation of the "similar estates" table served by estate/{pk}/similar/.
+
+The score of a pair of active estates blends two signals:
+- co-visitation: the cosine similarity of their visitor sets over the last
+  ``VISIT_WINDOW_DAYS`` days, i.e. the number of visitors who viewed both,
+  divided by the geometric mean of their visitor counts;
+- attributes: how close they are (exponential decay with the distance, or
+  the same city when coordinates are missing) and how close their prices
+  are (exponential decay with the log-price ratio).
+``CO_VISIT_WEIGHT`` sets the share of co-visitation in the blend. The top
+``NEIGHBOURS`` estates of each estate are stored in EstateSimilarity.
+
+The candidate neighbours of an estate are the estates of the same city and
+the estates co-visited with it: estates of other cities are too far away
+for the location score and were never seen together. An estate alone in
+its city and never co-visited has no neighbours. Everything is computed
+with NumPy: co-visit counts from the visitor-estate pairs, attribute scores
+city by city, in blocks of estates scored against their candidates of at
+most ``BLOCK_CELLS`` pairs, so that memory stays bounded whatever the
+number of estates. The work grows with the square of the size of the
+largest city. ``refresh_similarities()`` recomputes only the estates whose
+co-visits changed since the last build, and estates that have no neighbours
+yet.
+"""
+import datetime
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Estate, EstateSimilarity, Visit
+
+DEFAULTS = {
+    'NEIGHBOURS': 10,
+    'VISIT_WINDOW_DAYS': 180,
+    'MAX_ESTATES_PER_VISITOR': 100,
+    'CO_VISIT_WEIGHT': 0.7,
+}
+# Estate-candidate pairs scored at once: each float64 array of a block is at
+# most this many cells
+BLOCK_CELLS = 1_000_000
+# Pairs of co-visited estates generated at once
+PAIR_CHUNK_SIZE = 5_000_000
+# Distance in km and log-price difference at which the scores fall to 1/e
+DISTANCE_SCALE_KM = 5.0
+PRICE_SCALE = 0.25
+
+
+def get_similarity_setting(name):
+    return getattr(settings, 'SIMILAR_ESTATES', {}).get(name, DEFAULTS[name])
+
+
+def _load_estates():
+    rows = list(
+        Estate.objects.filter(is_active=True).order_by('id')
+        .values_list('id', 'location', 'price', 'latitude', 'longitude')
+    )
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    cities = {}
+    city = np.fromiter(
+        (cities.setdefault(row[1].split(',')[0].strip().casefold(), len(cities)) for row in rows),
+        dtype=np.int64, count=len(rows),
+    )
+    log_price = np.fromiter((math.log(max(float(row[2]), 1.0)) for row in rows), dtype=np.float64, count=len(rows))
+    latitude = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+    longitude = np.array([np.nan if row[4] is None else row[4] for row in rows], dtype=np.float64)
+    return ids, city, log_price, latitude, longitude
+
+
+def _load_visits(ids, since):
+    # Distinct (visitor, estate) pairs, as indexes into ids
+    pairs = np.array(
+        list(
+            Visit.objects.filter(visited_at__gte=since, estate__is_active=True)
+            .values_list('visitor_id', 'estate_id').distinct().order_by('visitor_id', 'estate_id')
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    visitors, estates = pairs[:, 0], np.searchsorted(ids, pairs[:, 1])
+    if not len(visitors):
+        return visitors, estates
+    # Heavy visitors (and crawlers) would dominate the pairs
+    starts = np.flatnonzero(np.r_[True, visitors[1:] != visitors[:-1]])
+    sizes = np.diff(np.r_[starts, len(visitors)])
+    position = np.arange(len(visitors)) - np.repeat(starts, sizes)
+    keep = position < get_similarity_setting('MAX_ESTATES_PER_VISITOR')
+    return visitors[keep], estates[keep]
+
+
+def _co_visits(visitors, estates, n, rows):
+    """
+    Return the (left, right, count) arrays of co-visited estate pairs whose
+    left estate is in ``rows``, sorted by left.
+    """
+    if not len(visitors):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, visitors[1:] != visitors[:-1]])
+    sizes = np.diff(np.r_[starts, len(visitors)])
+    wanted = np.zeros(n, dtype=bool)
+    wanted[rows] = True
+
+    keys, counts = [], []
+    group = 0
+    while group < len(starts):
+        # As many visitors as fit in one chunk of pairs
+        pairs = np.cumsum(sizes[group:] ** 2)
+        end = group + max(1, int(np.searchsorted(pairs, PAIR_CHUNK_SIZE, side='right')))
+        first, last = starts[group], starts[end - 1] + sizes[end - 1]
+        chunk_sizes = np.repeat(sizes[group:end], sizes[group:end])
+        chunk_starts = np.repeat(starts[group:end], sizes[group:end])
+        left = np.repeat(estates[first:last], chunk_sizes)
+        # Pair every visit with each visit of the same visitor
+        block_start = np.repeat(np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes)
+        right = estates[np.repeat(chunk_starts, chunk_sizes) + np.arange(len(left)) - block_start]
+        mask = (left != right) & wanted[left]
+        chunk_keys, chunk_counts = np.unique(left[mask] * n + right[mask], return_counts=True)
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+        group = end
+
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts))
+    return keys // n, keys % n, counts
+
+
+def _attribute_scores(left, right, city, log_price, latitude, longitude):
+    """
+    Scores of the estates ``left`` against the estates ``right``, index
+    arrays broadcast against each other.
+    """
+    # Equirectangular distance is precise enough at city scale
+    lat = np.radians(latitude)
+    mean_lat = (lat[left] + lat[right]) / 2
+    dx = np.radians(longitude[left] - longitude[right]) * np.cos(mean_lat)
+    dy = lat[left] - lat[right]
+    distance = 6371.0 * np.sqrt(dx ** 2 + dy ** 2)
+    same_city = (city[left] == city[right]).astype(np.float64)
+    location = np.where(np.isnan(distance), 0.5 * same_city, np.exp(-distance / DISTANCE_SCALE_KM))
+    price = np.exp(-np.abs(log_price[left] - log_price[right]) / PRICE_SCALE)
+    return 0.6 * location + 0.4 * price
+
+
+def _block_co_visits(block, left, right):
+    """
+    Return the indexes of the co-visit pairs of the estates ``block``, and
+    the position of each pair among the pairs of its estate.
+    """
+    low, high = np.searchsorted(left, [block[0], block[-1] + 1])
+    pairs = np.arange(low, high)
+    pairs = pairs[np.isin(left[pairs], block)]
+    starts = np.flatnonzero(np.r_[True, left[pairs][1:] != left[pairs][:-1]]) if len(pairs) else pairs
+    sizes = np.diff(np.r_[starts, len(pairs)])
+    return pairs, np.arange(len(pairs)) - np.repeat(starts, sizes)
+
+
+def _compute(estate_ids=None):
+    """
+    Yield (estate ids, neighbour ids, scores) blocks for the given estates,
+    or for all active estates. Inactive estates are skipped. Scores of -inf
+    pad the lists of estates with fewer candidates than neighbours.
+    """
+    ids, city, log_price, latitude, longitude = _load_estates()
+    n = len(ids)
+    if n < 2:
+        return
+    if estate_ids is None:
+        rows = np.arange(n)
+    else:
+        rows = np.flatnonzero(np.isin(ids, list(estate_ids)))
+        if not len(rows):
+            return
+    neighbours = min(get_similarity_setting('NEIGHBOURS'), n - 1)
+    weight = get_similarity_setting('CO_VISIT_WEIGHT')
+
+    since = timezone.now() - datetime.timedelta(days=get_similarity_setting('VISIT_WINDOW_DAYS'))
+    visitors, estates = _load_visits(ids, since)
+    visitor_counts = np.bincount(estates, minlength=n).astype(np.float64)
+    left, right, counts = _co_visits(visitors, estates, n, rows)
+    cosine = counts / np.sqrt(visitor_counts[left] * visitor_counts[right]) if len(counts) else counts
+
+    # The estates of each city, and the rows to compute grouped by city
+    by_city = np.argsort(city, kind='stable')
+    city_starts = np.searchsorted(city[by_city], np.arange(city.max() + 2))
+    rows = rows[np.argsort(city[rows], kind='stable')]
+    groups = np.flatnonzero(np.r_[True, city[rows][1:] != city[rows][:-1], True])
+
+    for first, last in zip(groups[:-1], groups[1:]):
+        block_city = city[rows[first]]
+        members = by_city[city_starts[block_city]:city_starts[block_city + 1]]
+        start = first
+        while start < last:
+            size = min(last - start, max(1, BLOCK_CELLS // len(members)))
+            # Estates co-visited with an estate of another city are scored in
+            # extra columns, one per pair: shrink the block until they fit
+            while True:
+                block = rows[start:start + size]
+                pairs, position = _block_co_visits(block, left, right)
+                columns = len(members) + (int(position.max()) + 1 if len(pairs) else 0)
+                if size == 1 or len(block) * columns <= BLOCK_CELLS:
+                    break
+                size //= 2
+            start += size
+            count = min(neighbours, columns - 1)
+            if not count:
+                continue
+
+            scores = np.full((len(block), columns), -np.inf)
+            scores[:, :len(members)] = (1 - weight) * _attribute_scores(
+                block[:, None], members[None, :], city, log_price, latitude, longitude,
+            )
+            pair_rows = np.searchsorted(block, left[pairs])
+            local = city[right[pairs]] == block_city
+            scores[pair_rows[local], np.searchsorted(members, right[pairs][local])] += weight * cosine[pairs][local]
+            pair_rows, pairs, position = pair_rows[~local], pairs[~local], position[~local]
+            scores[pair_rows, len(members) + position] = (
+                (1 - weight) * _attribute_scores(left[pairs], right[pairs], city, log_price, latitude, longitude)
+                + weight * cosine[pairs]
+            )
+            extra = np.zeros((len(block), columns - len(members)), dtype=np.int64)
+            extra[pair_rows, position] = right[pairs]
+            # An estate is not its own neighbour
+            scores[np.arange(len(block)), np.searchsorted(members, block)] = -np.inf
+
+            top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            is_member = top < len(members)
+            neighbour_rows = np.where(
+                is_member, members[np.minimum(top, len(members) - 1)],
+                np.take_along_axis(extra, np.maximum(top - len(members), 0), axis=1) if extra.shape[1] else 0,
+            )
+            yield ids[block], ids[neighbour_rows], np.take_along_axis(top_scores, order, axis=1)
+
+
+def _store(blocks):
+    computed_at = timezone.now()
+    estates = 0
+    for estate_ids, neighbour_ids, scores in blocks:
+        rows = [
+            EstateSimilarity(
+                estate_id=estate_id, similar_id=similar_id, rank=rank, score=round(float(score), 6),
+                computed_at=computed_at,
+            )
+            for estate_id, similar_ids, similar_scores in zip(estate_ids.tolist(), neighbour_ids.tolist(), scores)
+            for rank, (similar_id, score) in enumerate(zip(similar_ids, similar_scores))
+            if score > -np.inf
+        ]
+        # One short transaction per block, so that readers always find full lists
+        with transaction.atomic():
+            EstateSimilarity.objects.filter(estate_id__in=estate_ids.tolist()).delete()
+            EstateSimilarity.objects.bulk_create(rows)
+        estates += len(estate_ids)
+    return estates
+
+
+def build_similarities():
+    """
+    Recompute the neighbours of every active estate. Return the number of
+    estates computed.
+    """
+    estates = _store(_compute())
+    # Inactive estates are never shown, so they need no neighbours
+    EstateSimilarity.objects.exclude(estate__is_active=True).delete()
+    return estates
+
+
+def refresh_similarities():
+    """
+    Recompute the estates co-visited by visitors active since the last
+    build, and the active estates without neighbours. Falls back to a full
+    build when there was none. Return the number of estates computed.
+    """
+    last_build = EstateSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+    if last_build is None:
+        return build_similarities()
+
+    since = timezone.now() - datetime.timedelta(days=get_similarity_setting('VISIT_WINDOW_DAYS'))
+    # Visits reach the table up to a buffer flush after they happen
+    recent_visitors = Visit.objects.filter(visited_at__gte=last_build - datetime.timedelta(minutes=1)).values('visitor_id')
+    affected = set(
+        Visit.objects.filter(visited_at__gte=since, visitor_id__in=recent_visitors)
+        .values_list('estate_id', flat=True).distinct()
+    )
+    affected.update(
+        Estate.objects.filter(is_active=True)
+        .exclude(pk__in=EstateSimilarity.objects.values('estate_id')).values_list('id', flat=True)
+    )
+    return _store(_compute(affected))
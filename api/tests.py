@@ -0,0 +1,73 @@
+import datetime
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .authentication import ClaimsRefreshToken
+from .models import Booking, CustomUser, Estate
+
+THREADS = 12
+ROUNDS = 3
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'booking-race'}},
+    REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+)
+class BookingRaceTests(TransactionTestCase):
+    """
+    Parallel bookings of one estate for the same dates, each request in a
+    thread with a database connection of its own, as check_booking_race
+    does against a running database.
+    """
+
+    def setUp(self):
+        landlord = CustomUser.objects.create_user('race-landlord', password='race-password', role='landlord')
+        self.estate = Estate.objects.create(
+            title='Race estate', description='Race check', location='Москва', price=3000, owner=landlord,
+        )
+        self.tokens = [
+            str(ClaimsRefreshToken.for_user(
+                CustomUser.objects.create_user(f'race-tenant-{i}', password='race-password', role='tenant')
+            ).access_token)
+            for i in range(THREADS)
+        ]
+
+    def book(self, check_in, check_out):
+        barrier = threading.Barrier(THREADS)
+        statuses = Counter()
+        lock = threading.Lock()
+        body = {'estate': self.estate.pk, 'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+
+        def post(token):
+            try:
+                client = Client(raise_request_exception=False)
+                barrier.wait()
+                response = client.post(
+                    reverse('booking-create'), body, content_type='application/json',
+                    HTTP_AUTHORIZATION=f'Bearer {token}',
+                )
+                with lock:
+                    statuses[response.status_code] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(token,)) for token in self.tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_exactly_one_booking_is_accepted(self):
+        for number in range(ROUNDS):
+            check_in = datetime.date.today() + datetime.timedelta(days=30 + number * 10)
+            with self.subTest(round=number + 1):
+                statuses = self.book(check_in, check_in + datetime.timedelta(days=3))
+                self.assertEqual(statuses, Counter({201: 1, 409: THREADS - 1}))
+                self.assertEqual(Booking.objects.filter(estate=self.estate, check_in=check_in).count(), 1)
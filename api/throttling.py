@@ -0,0 +1,201 @@
+"""
+Token-bucket request throttling per client IP and per user.
+
+Views opt in with a ``throttle_scope``: 'auth' for the login and
+registration endpoints, 'read' for the read endpoints. The rates are the
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] entries named '<scope>_ip' and
+'<scope>_user', in DRF's 'requests/period' format. A bucket holds that many
+requests and refills at that rate, so a burst up to the whole budget
+passes and sustained traffic is held to the rate. A scope without a rate
+is not throttled.
+
+The buckets of all worker processes of the host are kept in one table, a
+file of ``THROTTLE['SLOTS']`` fixed-size slots mapped into memory by each
+worker, so a check is a hash and a few bytes read and written under an
+exclusive lock on the file: a few microseconds, without any service or
+cache round trip. Keys are hashed with a key derived from SECRET_KEY, so
+that clients cannot pick names that share a bucket's slots, and each key
+has ``WAYS`` slots to choose from. When all of them hold other buckets, the
+one updated longest ago, the most likely to have refilled anyway, is
+replaced. Without ``fcntl`` (Windows) updates are not locked.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import salted_hmac
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULTS = {
+    # No default: a predictable path in a shared directory such as /tmp could
+    # be created beforehand, or be a symlink, by another local user
+    'PATH': None,
+    'SLOTS': 65536,
+}
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Slots a bucket may be stored in
+WAYS = 4
+# Key hash, tokens left, time of the last update
+_SLOT = struct.Struct('<Qdd')
+_SET = struct.Struct('<' + 'Qdd' * WAYS)
+
+_rates = {}
+
+
+def get_throttle_setting(name):
+    return getattr(settings, 'THROTTLE', {}).get(name, DEFAULTS[name])
+
+
+def parse_rate(rate):
+    """
+    '100/min' -> (bucket size, requests added per second)
+    """
+    if rate not in _rates:
+        requests, period = rate.split('/')
+        _rates[rate] = (int(requests), int(requests) / _PERIODS[period[0]])
+    return _rates[rate]
+
+
+class BucketTable:
+    """
+    Token buckets in a file shared by every process of the host.
+    """
+
+    def __init__(self, path, slots, secret):
+        self.path = path
+        self.sets = max(slots // WAYS, 1)
+        self.secret = secret
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file = None
+        self.map = None
+
+    def open(self):
+        # Reopened in forked workers: a lock is held per open file
+        if self.file is not None:
+            self.map.close()
+            self.file.close()
+        size = self.sets * WAYS * _SLOT.size
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        # Never through a symlink, and readable by the app's user only
+        descriptor = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+        self.file = os.fdopen(descriptor, 'r+b')
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.pid = os.getpid()
+
+    def take(self, key, size, refill):
+        """
+        Spend a token of the bucket ``key``. Returns 0, or the seconds until
+        a token is available if the bucket is empty.
+        """
+        digest = hashlib.blake2b(key.encode(), digest_size=8, key=self.secret).digest()
+        # 0 marks a free slot
+        digest = int.from_bytes(digest, 'little') or 1
+        first = digest % self.sets * WAYS
+        with self.lock:
+            if self.pid != os.getpid():
+                self.open()
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                fields = _SET.unpack_from(self.map, first * _SLOT.size)
+                digests = fields[0::3]
+                if digest in digests:
+                    way = digests.index(digest)
+                    tokens, updated = fields[way * 3 + 1], fields[way * 3 + 2]
+                    tokens = min(size, tokens + max(now - updated, 0) * refill)
+                else:
+                    # A new bucket, in place of the least recently updated one
+                    times = fields[2::3]
+                    way = times.index(min(times))
+                    tokens = size
+                # Refused requests update the bucket too, so that a drained
+                # bucket is not the first to be replaced
+                spent = 1 if tokens >= 1 else 0
+                _SLOT.pack_into(self.map, (first + way) * _SLOT.size, digest, tokens - spent, now)
+                return 0 if spent else (1 - tokens) / refill
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+_table = None
+
+
+def get_table():
+    global _table
+    if _table is None:
+        if not get_throttle_setting('PATH'):
+            raise ImproperlyConfigured("THROTTLE['PATH'] must be set to a file in a directory the app owns.")
+        secret = salted_hmac('api.throttling', 'bucket keys', algorithm='sha256').digest()
+        _table = BucketTable(get_throttle_setting('PATH'), get_throttle_setting('SLOTS'), secret)
+    return _table
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Spend a token of the client's bucket for the view's scope, or refuse the
+    request until one is added back.
+    """
+    kind = None
+    wait_seconds = None
+
+    def get_client_key(self, request):
+        """
+        The identity whose bucket the request spends, or None to let it pass.
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.kind}') if scope else None
+        if rate is None:
+            return True
+        client = self.get_client_key(request)
+        if client is None:
+            return True
+        self.wait_seconds = get_table().take(f'{scope}:{self.kind}:{client}', *parse_rate(rate))
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_client_key(self, request):
+        # REMOTE_ADDR, or the address the last of REST_FRAMEWORK['NUM_PROXIES']
+        # proxies put in X-Forwarded-For
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Buckets per authenticated user, and per client address and username
+    submitted to the auth endpoints. A client guessing one account's password
+    runs out before its address's budget for all accounts does, while
+    attempts from other addresses cannot lock the account's owner out.
+    """
+    kind = 'user'
+
+    def get_client_key(self, request):
+        if request.user.is_authenticated:
+            return f'id:{request.user.pk}'
+        if request.method not in SAFE_METHODS and isinstance(request.data, dict) and request.data.get('username'):
+            return f"name:{self.get_ident(request)}:{request.data['username']}"
+        return None
@@ -1,6 +1,15 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterUserView, LoginUserView, EstateListView, EstateDetailView, CreateEstateView, UpdateEstateView, DeleteEstateView, CreateBookingView, RetrieveBookingView, CreateReviewView, SearchHistoryView, VisitorsView
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from .views import RegisterUserView, LoginUserView, EstateListView, EstateDetailView, SimilarEstatesView, CreateEstateView, ImportEstatesView, UpdateEstateView, BulkUpdateEstatesView, DeleteEstateView, CreateBookingView, RetrieveBookingView, BookingInboxView, CreateReviewView, SearchHistoryView, VisitorsView
+
+# Serve the read-heavy endpoints with async views under ASGI
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import (
+        AsyncEstateListView as EstateListView,
+        AsyncEstateDetailView as EstateDetailView,
+        AsyncSearchHistoryView as SearchHistoryView,
+        AsyncVisitorsView as VisitorsView,
+    )
 
 urlpatterns = [
     path('user/register/', RegisterUserView.as_view(), name='user-register'),
@@ -11,12 +20,15 @@ urlpatterns = [
 urlpatterns += [
     path('estate/', EstateListView.as_view(), name='estate-list'),
     path('estate/<int:pk>/', EstateDetailView.as_view(), name='estate-detail'),
+    path('estate/<int:pk>/similar/', SimilarEstatesView.as_view(), name='estate-similar'),
 ]
 
-# Add routes for creating, updating, and deleting estates
+# Add routes for creating, importing, updating, bulk updating, and deleting estates
 urlpatterns += [
     path('estate/create/', CreateEstateView.as_view(), name='estate-create'),
+    path('estate/import/', ImportEstatesView.as_view(), name='estate-import'),
     path('estate/<int:pk>/update/', UpdateEstateView.as_view(), name='estate-update'),
+    path('estate/bulk/', BulkUpdateEstatesView.as_view(), name='estate-bulk-update'),
     path('estate/<int:pk>/delete/', DeleteEstateView.as_view(), name='estate-delete'),
 ]
 
@@ -25,9 +37,10 @@ urlpatterns += [
     path('booking/create/', CreateBookingView.as_view(), name='booking-create'),
 ]
 
-# Add route for retrieving a booking by ID
+# Add routes for retrieving a booking by ID and the landlord's booking inbox
 urlpatterns += [
     path('booking/<int:pk>/', RetrieveBookingView.as_view(), name='booking-retrieve'),
+    path('booking/inbox/', BookingInboxView.as_view(), name='booking-inbox'),
 ]
 
 # Add routes for reviews, history, and visitors
@@ -37,9 +50,13 @@ urlpatterns += [
     path('visitors/', VisitorsView.as_view(), name='visitors-list'),
 ]
 
-# Add routes for drf-spectacular schema and Swagger UI
-urlpatterns += [
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
-]
+# Add routes for the OpenAPI schema, Swagger UI and ReDoc
+if settings.API_DOCS['ENABLED']:
+    from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+    from .schema import schema_view
+
+    urlpatterns += [
+        path('schema/', schema_view, name='schema'),
+        path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+        path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    ]
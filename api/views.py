@@ -1,15 +1,28 @@
+
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from django.utils import timezone
-from rest_framework import generics, permissions, status, serializers
+from rest_framework import exceptions, generics, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from drf_spectacular.utils import extend_schema
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import CustomUser, Estate, Booking, Review, Visit, SearchHistory
+from . import imports
+from .authentication import ClaimsRefreshToken
+from .buffers import search_history_buffer, visit_buffer
+from .cache import LIST_VERSION_KEY, OCCUPANCY_VERSION_KEY, CachedResponseMixin, bump_estate_versions, estate_version_key
+from .docs import OpenApiTypes, extend_schema
+from .exceptions import BookingConflict, LengthRequired
+from .exports import ExportMixin
+from .fastpath import ValuesListMixin
+from .filters import EstateFilter, EstateOrderingFilter, EstateSearchFilter, filter_choices, filter_period
+from .ownership import OwnedEstateMixin, delete_estates, update_estates
+from .pagination import BookingInboxCursorPagination, EstateCursorPagination, EstateSearchPagination, SearchHistoryCursorPagination
+from .ratings import add_score
+from .routers import ReplicaReadMixin
+from .models import CustomUser, Estate, EstateSimilarity, Booking, Review, Visit, VisitDailyStats, SearchHistory
 from .serializers import (
-    CustomUserSerializer, EstateSerializer, BookingSerializer,
-    ReviewSerializer, VisitSerializer, SearchHistorySerializer
+    CustomUserSerializer, EstateSerializer, EstateBulkUpdateSerializer, SimilarEstateSerializer, BookingSerializer,
+    BookingInboxSerializer, ReviewSerializer, VisitSerializer, VisitDailyStatsSerializer, SearchHistorySerializer
 )
 
 # Define a serializer for login requests
@@ -23,6 +36,7 @@ class RegisterUserView(APIView):
     Create a new user with login, password, and role.
     """
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'auth'
 
     @extend_schema(
         summary="User Registration",
@@ -43,6 +57,7 @@ class LoginUserView(APIView):
     Authenticate user and provide JWT credentials.
     """
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'auth'
 
     @extend_schema(
         summary="User Login",
@@ -63,7 +78,8 @@ class LoginUserView(APIView):
         password = request.data.get('password')
         user = CustomUser.objects.filter(username=username).first()
         if user and user.check_password(password):
-            refresh = RefreshToken.for_user(user)
+            # The role claim lets requests authenticate without loading the user
+            refresh = ClaimsRefreshToken.for_user(user)
             response = Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -76,36 +92,103 @@ class LoginUserView(APIView):
 
 # Additional views for Estate, Booking, Review, History, and Visitors
 
-class EstateListView(generics.ListAPIView):
+class EstateListView(ReplicaReadMixin, CachedResponseMixin, ValuesListMixin, generics.ListAPIView):
     """
     GET estate:
     Returns a paginated list of active estate offers. Saves filter parameters in history for authorized users.
+    With the `q` parameter, returns full-text search results ranked by relevance.
+    Filters by price range (`price_min`, `price_max`), by area (`bbox`, `near`) and by availability
+    for a stay (`check_in`, `check_out`).
+    Sorts by `ordering` (`id`, `price` or `rating_avg`, prefixed with `-` for descending order).
+    Responses are cached until an estate changes and support conditional requests.
     """
     queryset = Estate.objects.filter(is_active=True)
     serializer_class = EstateSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['title', 'location', 'price', 'is_active']
+    throttle_scope = 'read'
+    pagination_class = EstateCursorPagination
+    filter_backends = [DjangoFilterBackend, EstateSearchFilter, EstateOrderingFilter]
+    filterset_class = EstateFilter
+    ordering_fields = ['id', 'price', 'rating_avg']
+
+    @property
+    def paginator(self):
+        # Ranked search results are ordered by score, not by id, so they cannot
+        # be paginated with the id cursor
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get(EstateSearchFilter.search_param, '').strip():
+                self._paginator = EstateSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_cache_version_keys(self):
+        if 'check_in' in self.request.query_params or 'check_out' in self.request.query_params:
+            # Availability also changes with the bookings
+            return [LIST_VERSION_KEY, OCCUPANCY_VERSION_KEY]
+        return [LIST_VERSION_KEY]
 
     def get(self, request, *args, **kwargs):
         if request.user.is_authenticated:
-            SearchHistory.objects.create(user=request.user, query=request.GET.dict())
+            # Written in batches in the background, see api.buffers
+            search_history_buffer.put(self.get_search_record(request))
         return super().get(request, *args, **kwargs)
 
-class EstateDetailView(generics.RetrieveAPIView):
+    def get_search_record(self, request):
+        return SearchHistory(user_id=request.user.id, query=request.GET.dict())
+
+class EstateDetailView(ReplicaReadMixin, CachedResponseMixin, generics.RetrieveAPIView):
     """
     GET estate/{pk}:
-    Returns a single estate record by ID.
+    Returns a single estate record by ID. Records a visit for authorized users.
+    Responses are cached until the estate changes and support conditional requests.
     """
     queryset = Estate.objects.all()
     serializer_class = EstateSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'read'
+
+    def get_cache_version_keys(self):
+        return [estate_version_key(self.kwargs['pk'])]
 
     @extend_schema(
         summary="Retrieve Estate",
-        description="Returns a single estate record by ID.",
+        description="Returns a single estate record by ID. Records a visit for authorized users.",
         responses={200: EstateSerializer},
     )
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            # Written in batches in the background, see api.buffers
+            visit_buffer.put(self.get_visit_record(request))
+        return response
+
+    def get_visit_record(self, request):
+        return Visit(estate_id=self.kwargs['pk'], visitor_id=request.user.id)
+
+class SimilarEstatesView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    GET estate/{pk}/similar:
+    Returns the active estates most similar to an estate, most similar first.
+    Read from the table built by the build_similar_estates command, see api.similarity.
+    """
+    serializer_class = SimilarEstateSerializer
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = 'read'
+    pagination_class = None
+
+    def get_queryset(self):
+        return (
+            EstateSimilarity.objects.filter(estate_id=self.kwargs['pk'], similar__is_active=True)
+            .select_related('similar').order_by('rank')
+        )
+
+    @extend_schema(
+        summary="Similar Estates",
+        description="Returns the active estates most similar to an estate, most similar first, "
+                    "based on co-visits, location, and price.",
+        responses={200: SimilarEstateSerializer(many=True)},
+    )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -130,14 +213,55 @@ class CreateEstateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         # Automatically set the owner to the currently authenticated user
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.id)
+
+class ImportEstatesView(APIView):
+    """
+    POST estate/import:
+    Bulk-create estates from an NDJSON or CSV request body. Allowed only for landlords.
+    Valid rows are imported, invalid ones are listed in the report by line number.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        summary="Import Estates",
+        description="Bulk-create estates from an NDJSON (`application/x-ndjson`) or CSV (`text/csv`, with a header row) "
+                    "request body. Allowed only for landlords. Valid rows are imported, invalid ones are listed "
+                    "in the report by line number.",
+        request={'application/x-ndjson': OpenApiTypes.BINARY, 'text/csv': OpenApiTypes.BINARY},
+        responses={
+            200: {
+                'type': 'object',
+                'properties': {
+                    'created': {'type': 'integer'},
+                    'failed': {'type': 'integer'},
+                    'errors': {'type': 'array', 'items': {'type': 'object'}},
+                    'errors_truncated': {'type': 'boolean'},
+                },
+            },
+        },
+    )
+    def post(self, request):
+        if self.request.user.role != 'landlord':
+            raise PermissionDenied("Only landlords can import estates.")
+        media_type = request.content_type.split(';')[0].strip().lower()
+        if media_type not in imports.CONTENT_TYPES:
+            raise exceptions.UnsupportedMediaType(media_type)
+        # A body sent without a Content-Length (chunked) never reaches the
+        # stream, and would be imported as nothing
+        if not request.META.get('CONTENT_LENGTH'):
+            raise LengthRequired()
+        if request.stream is None:
+            raise exceptions.ValidationError('The request body is empty.')
+        # Read the body as a stream instead of parsing it into request.data
+        rows = imports.read_rows(request.stream, imports.CONTENT_TYPES[media_type])
+        return Response(imports.import_estates(rows, owner_id=request.user.id), status=status.HTTP_200_OK)
 
-class UpdateEstateView(generics.UpdateAPIView):
+class UpdateEstateView(OwnedEstateMixin, generics.UpdateAPIView):
     """
     PATCH estate/{pk}:
     Update an estate. Allowed only for the owner landlord.
     """
-    queryset = Estate.objects.all()
     serializer_class = EstateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -148,17 +272,77 @@ class UpdateEstateView(generics.UpdateAPIView):
         responses={200: EstateSerializer},
     )
     def patch(self, request, *args, **kwargs):
-        estate = self.get_object()
-        if estate.owner != self.request.user:
-            raise PermissionDenied("You are not the owner of this estate.")
-        return super().patch(request, *args, **kwargs)
+        pk = self.kwargs['pk']
+        fields = request.data.keys() if isinstance(request.data, dict) else set()
+        if len({'latitude', 'longitude'} & fields) == 1:
+            # A single coordinate is validated against the stored one
+            return self.patch_locked(request, pk)
+        serializer = self.get_serializer(data=request.data, partial=True)
+        if not serializer.is_valid():
+            # What is wrong with the body is told to the owner only
+            if not self.get_queryset().filter(pk=pk).exists():
+                raise self.ownership_error(pk)
+            raise exceptions.ValidationError(serializer.errors)
+        if serializer.validated_data and not update_estates(self.get_queryset().filter(pk=pk), [pk], serializer.validated_data):
+            raise self.ownership_error(pk)
+        estate = self.get_queryset().filter(pk=pk).first()
+        if estate is None:
+            raise self.ownership_error(pk)
+        return Response(self.get_serializer(estate).data)
+
+    def patch_locked(self, request, pk):
+        with transaction.atomic():
+            estate = self.get_queryset().select_for_update().filter(pk=pk).first()
+            if estate is None:
+                raise self.ownership_error(pk)
+            serializer = self.get_serializer(estate, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(serializer.data)
+
+class BulkUpdateEstatesView(OwnedEstateMixin, generics.GenericAPIView):
+    """
+    PATCH estate/bulk:
+    Change the price and/or the is_active flag of many estates of the landlord in one transaction.
+    Estates given the same values are updated with one statement. Fails as a whole with 403 if any
+    of the estates is missing or owned by someone else.
+    """
+    serializer_class = EstateBulkUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_estates = 1000
+
+    @extend_schema(
+        summary="Bulk Update Estates",
+        description="Change the price and/or the is_active flag of many estates of the landlord in one transaction.",
+        request=EstateBulkUpdateSerializer(many=True),
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def patch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.max_estates)
+        serializer.is_valid(raise_exception=True)
+        # Group the estates by the values they are given
+        groups = {}
+        for item in serializer.validated_data:
+            fields = tuple(sorted((name, value) for name, value in item.items() if name != 'id'))
+            groups.setdefault(fields, []).append(item['id'])
+
+        ids = [item['id'] for item in serializer.validated_data]
+        with transaction.atomic():
+            updated = sum(
+                update_estates(self.get_queryset().filter(pk__in=group_ids), group_ids, dict(fields))
+                for fields, group_ids in groups.items()
+            )
+            if updated != len(ids):
+                owned = set(self.get_queryset().filter(pk__in=ids).values_list('pk', flat=True))
+                missing = ', '.join(str(pk) for pk in ids if pk not in owned)
+                raise PermissionDenied(f"You are not the owner of these estates, or they do not exist: {missing}.")
+        return Response({'updated': updated})
 
-class DeleteEstateView(generics.DestroyAPIView):
+class DeleteEstateView(OwnedEstateMixin, generics.DestroyAPIView):
     """
     DELETE estate/{pk}:
     Delete an estate. Allowed only for the owner landlord.
     """
-    queryset = Estate.objects.all()
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
@@ -167,15 +351,16 @@ class DeleteEstateView(generics.DestroyAPIView):
         responses={204: None},
     )
     def delete(self, request, *args, **kwargs):
-        estate = self.get_object()
-        if estate.owner != self.request.user:
-            raise PermissionDenied("You are not the owner of this estate.")
-        return super().delete(request, *args, **kwargs)
+        pk = self.kwargs['pk']
+        if not delete_estates(self.get_queryset().filter(pk=pk), [pk]):
+            raise self.ownership_error(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class CreateBookingView(generics.CreateAPIView):
     """
     POST booking/:
     Create a booking for an estate. Allowed only for tenants.
+    Responds with 409 if the dates overlap a pending or approved booking.
     """
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -192,10 +377,18 @@ class CreateBookingView(generics.CreateAPIView):
         return super().post(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        # Automatically set the tenant to the currently authenticated user
-        serializer.save(tenant=self.request.user)
+        data = serializer.validated_data
+        with transaction.atomic():
+            # Lock the estate row so that concurrent bookings of the same estate
+            # are checked and saved one at a time. SQLite has no row locks and
+            # relies on the IMMEDIATE transaction mode configured in settings.
+            Estate.objects.select_for_update().filter(pk=data['estate'].pk).exists()
+            if Booking.objects.overlapping(data['estate'], data['check_in'], data['check_out']).exists():
+                raise BookingConflict()
+            # Automatically set the tenant to the currently authenticated user
+            serializer.save(tenant_id=self.request.user.id)
 
-class RetrieveBookingView(generics.RetrieveAPIView):
+class RetrieveBookingView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     GET booking/{pk}:
     Retrieve a booking by ID. Allowed for the tenant who created the booking or the landlord of the related estate.
@@ -203,6 +396,7 @@ class RetrieveBookingView(generics.RetrieveAPIView):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'read'
 
     @extend_schema(
         summary="Retrieve Booking",
@@ -212,6 +406,37 @@ class RetrieveBookingView(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+class BookingInboxView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    GET booking/inbox:
+    Retrieve the bookings of all estates owned by the landlord, by check-in date and paginated by cursor,
+    optionally limited to the `status` (one or several, comma-separated) and to check-in dates from `since`
+    to `until`. Each booking comes with the estate title and the tenant's username.
+    """
+    serializer_class = BookingInboxSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'read'
+    pagination_class = BookingInboxCursorPagination
+
+    def get_queryset(self):
+        if self.request.user.role != 'landlord':
+            return Booking.objects.none()
+        # One query per page however many estates the landlord has, read in
+        # the keyset order from the (landlord, [status,] check_in, id) indexes
+        queryset = Booking.objects.filter(landlord_id=self.request.user.id).select_related('estate', 'tenant').only(
+            'id', 'estate_id', 'tenant_id', 'check_in', 'check_out', 'status', 'estate__title', 'tenant__username',
+        )
+        queryset = filter_choices(queryset, self.request.query_params, 'status', Booking.STATUS_CHOICES)
+        return filter_period(queryset, self.request.query_params, 'check_in', dates_only=True)
+
+    @extend_schema(
+        summary="Booking Inbox",
+        description="Retrieve the bookings of all estates owned by the landlord, filtered by status and check-in dates.",
+        responses={200: BookingInboxSerializer(many=True)},
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 class CreateReviewView(generics.CreateAPIView):
     """
     POST review:
@@ -229,28 +454,69 @@ class CreateReviewView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
-class SearchHistoryView(generics.ListAPIView):
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            review = serializer.save()
+            # Keep the estate's rating aggregates in step with its reviews
+            add_score(review.estate_id, review.score)
+        transaction.on_commit(lambda: bump_estate_versions([review.estate_id]))
+
+class SearchHistoryView(ReplicaReadMixin, ExportMixin, ValuesListMixin, generics.ListAPIView):
     """
     GET history:
-    Retrieve the search history for the authenticated tenant.
+    Retrieve the search history for the authenticated tenant, newest first and paginated by cursor,
+    optionally limited to the `since` and `until` times. Repeated identical searches are listed once,
+    with their count in `hits` and the time of the last one in `searched_at`.
+    With `export=csv` or `export=ndjson`, streams the records as a file download instead.
     """
     serializer_class = SearchHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'read'
+    pagination_class = SearchHistoryCursorPagination
+    export_columns = {'id': 'id', 'query': 'query', 'searched_at': 'searched_at', 'hits': 'hits', 'user': 'user_id'}
+    export_filename = 'search-history'
 
     def get_queryset(self):
         if self.request.user.role == 'tenant':
-            return SearchHistory.objects.filter(user=self.request.user)
+            queryset = SearchHistory.objects.filter(user_id=self.request.user.id)
+            return filter_period(queryset, self.request.query_params, 'searched_at')
         return SearchHistory.objects.none()
 
-class VisitorsView(generics.ListAPIView):
+class VisitorsView(ReplicaReadMixin, ExportMixin, ValuesListMixin, generics.ListAPIView):
     """
     GET visitors:
-    Retrieve all visitor records for estates owned by the landlord.
+    Retrieve all visitor records for estates owned by the landlord, optionally limited to the `since` and `until` times.
+    With `aggregate=daily`, returns visit and unique visitor counts per estate and day instead,
+    optionally limited to the `since` and `until` dates.
+    With `export=csv` or `export=ndjson`, streams either list as a file download instead.
     """
     serializer_class = VisitSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'read'
+    export_filename = 'visitors'
+
+    def is_aggregated(self):
+        return self.request.query_params.get('aggregate') == 'daily'
+
+    def get_serializer_class(self):
+        if self.is_aggregated():
+            return VisitDailyStatsSerializer
+        return super().get_serializer_class()
+
+    def get_export_columns(self):
+        if self.is_aggregated():
+            return {'estate': 'estate_id', 'day': 'day', 'visits': 'visits', 'unique_visitors': 'unique_visitors'}
+        return {'id': 'id', 'visited_at': 'visited_at', 'estate': 'estate_id', 'visitor': 'visitor_id'}
 
     def get_queryset(self):
-        if self.request.user.role == 'landlord':
-            return Visit.objects.filter(estate__owner=self.request.user)
-        return Visit.objects.none()
+        if self.request.user.role != 'landlord':
+            return Visit.objects.none()
+        if self.is_aggregated():
+            return self.get_daily_stats_queryset()
+        queryset = Visit.objects.filter(estate__owner_id=self.request.user.id)
+        return filter_period(queryset, self.request.query_params, 'visited_at')
+
+    def get_daily_stats_queryset(self):
+        queryset = VisitDailyStats.objects.filter(estate__owner_id=self.request.user.id)
+        queryset = filter_period(queryset, self.request.query_params, 'day', dates_only=True)
+        return queryset.order_by('-day', 'estate')
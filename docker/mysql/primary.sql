@@ -0,0 +1,6 @@
+-- Account the read replica replicates with (see docker-compose.yml).
+-- Kept out of the binary log, so the replica does not create it too.
+SET SQL_LOG_BIN = 0;
+CREATE USER IF NOT EXISTS 'replicator'@'%' IDENTIFIED BY 'replicator';
+GRANT REPLICATION SLAVE ON *.* TO 'replicator'@'%';
+SET SQL_LOG_BIN = 1;
@@ -0,0 +1,11 @@
+-- Replicate everything from the primary with GTID auto-positioning. The
+-- application database and user are created by replaying the primary's
+-- binary log, which is why the replica service does not set MYSQL_DATABASE
+-- or MYSQL_USER. The replica retries until the primary is up.
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'db',
+    SOURCE_USER = 'replicator',
+    SOURCE_PASSWORD = 'replicator',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+START REPLICA;
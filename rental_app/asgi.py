@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Production servers run it with uvicorn, e.g.
+    uvicorn rental_app.asgi:application --host 0.0.0.0 --port 8000 --workers 2
 """
 
 import os
@@ -12,5 +15,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rental_app.settings')
+# Serve the read-heavy endpoints with async views
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+# Async views run their queries in per-request threads, whose persistent
+# connections would never be reused
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
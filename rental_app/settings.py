@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from tempfile import gettempdir
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it times the whole chain (see REQUEST_METRICS below)
+    'api.metrics.RequestMetricsMiddleware',
+    # Only loaded when a read replica is configured
+    'api.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,17 +74,127 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'rental_app.wsgi.application'
 
+# Serve the read-heavy endpoints with async views (see api/async_views.py).
+# The ASGI entry point turns this on unless the environment says otherwise.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
+# DB_ENGINE selects SQLite (the default) or MySQL, configured by the other
+# DB_* variables. Setting DB_REPLICA_HOST adds a read replica of the MySQL
+# database (see api/routers.py).
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+# Seconds a connection is reused across requests (0 closes it after each
+# request); its health is checked before reuse. The ASGI entry point
+# defaults to 0, since async views run their queries in short-lived threads.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+# Run SQLite for production traffic: WAL journaling and pragmas tuned for
+# concurrency, applied on connect, and writers serialized through a lock file
+# instead of SQLite's busy polling (see api/backends/sqlite3/base.py). Compare
+# with the default mode using 'manage.py stress_sqlite'.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '0') == '1'
+
+if DB_ENGINE == 'mysql':
+    def mysql_database(host, port, user, password):
+        return {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ.get('DB_NAME', 'rental_app'),
+            'USER': user,
+            'PASSWORD': password,
+            'HOST': host,
+            'PORT': port,
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                'isolation_level': 'read committed',
+            },
+        }
+
+    DATABASES = {
+        'default': mysql_database(
+            os.environ.get('DB_HOST', 'localhost'),
+            os.environ.get('DB_PORT', '3306'),
+            os.environ.get('DB_USER', 'user'),
+            os.environ.get('DB_PASSWORD', 'password'),
+        ),
+    }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = mysql_database(
+            os.environ['DB_REPLICA_HOST'],
+            os.environ.get('DB_REPLICA_PORT', '3306'),
+            os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+            os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        )
+        # Tests read the replica through the primary's connection
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+        DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Start write transactions with BEGIN IMMEDIATE so that SQLite serializes
+            # them up front (it has no SELECT ... FOR UPDATE), and let waiting
+            # writers queue for the lock instead of failing with "database is locked".
+            # Every atomic() block of the app writes, and most read first: begun
+            # DEFERRED, such a block fails at its first write, without waiting,
+            # once another writer has committed since its read. Reads outside
+            # atomic() run in autocommit mode and take no write lock.
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file rather than the in-memory default, whose shared cache
+            # fails concurrent connections at once instead of making them wait
+            'TEST': {'NAME': BASE_DIR / 'test-db.sqlite3'},
+        }
+    }
+    if SQLITE_PRODUCTION:
+        DATABASES['default']['ENGINE'] = 'api.backends.sqlite3'
+        DATABASES['default']['OPTIONS']['init_command'] = ';'.join([
+            # Readers and the writer do not block each other
+            'PRAGMA journal_mode = WAL',
+            # Safe with WAL: a power loss may drop the last commits, never corrupt the file
+            'PRAGMA synchronous = NORMAL',
+            'PRAGMA mmap_size = 268435456',
+            # In KiB when negative
+            'PRAGMA cache_size = -65536',
+            # The busy timeout is the 'timeout' option above
+        ])
+
+# Seconds a user's reads stay on the primary after they write, and a cached
+# response changed this recently is rebuilt from the primary, so that the
+# replica's lag is never seen
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# A file-based cache is shared by all worker processes on the host without
+# running an external service.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(gettempdir(), 'estate4rent-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Seconds a cached estate list or detail response is kept. Writes invalidate
+# cached responses immediately (see api/cache.py), so this only bounds size.
+ESTATE_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,27 +237,61 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Add the installed apps for DRF, JWT, and Swagger
+# OpenAPI schema and docs UIs (see api/schema.py). The schema is built once
+# by 'manage.py build_schema' into SCHEMA_DIR and served from there, gzipped
+# and with an ETag; without the files (or with DEBUG) it is generated on the
+# first request of each worker. Turned off, drf-spectacular is not imported
+# and the schema and docs routes are not added.
+API_DOCS = {
+    'ENABLED': os.environ.get('API_DOCS', '1') == '1',
+    'SCHEMA_DIR': os.environ.get('SCHEMA_DIR', os.path.join(BASE_DIR, 'schema')),
+}
+
+# Add the installed apps for DRF and JWT
 default_apps = [
     'rest_framework',
     'rest_framework_simplejwt',
-    'drf_spectacular',
-    'drf_yasg',
 ]
 INSTALLED_APPS += default_apps
 
+# Add the app for the OpenAPI schema and Swagger
+if API_DOCS['ENABLED']:
+    INSTALLED_APPS += ['drf_spectacular']
+
 # Register the 'api' app
 INSTALLED_APPS += ['api']
 
 # Configure DRF settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Token buckets per client IP and per user, for the views with a
+    # throttle_scope (see THROTTLE below). THROTTLING=0 turns them off.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.IPTokenBucketThrottle',
+        'api.throttling.UserTokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        # Login and registration, which hash passwords
+        'auth_ip': '30/min',
+        'auth_user': '10/min',
+        # The read endpoints
+        'read_ip': '1200/min',
+        'read_user': '600/min',
+    } if os.environ.get('THROTTLING', '1') == '1' else {},
+    # Reverse proxies in front of the app whose X-Forwarded-For entries identify
+    # the client. With 0, clients are identified by REMOTE_ADDR and the header,
+    # which they can set to anything, is ignored.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
+    # orjson, with the same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 desc = """
@@ -158,5 +308,65 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': True,
 }
 
+if API_DOCS['ENABLED']:
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+
 # Specify the custom user model
 AUTH_USER_MODEL = 'api.CustomUser'
+
+# Seconds the user fields loaded for token authentication, and the time the
+# user's tokens were last revoked, are kept in the cache. Access tokens issued
+# at login carry the user's role, so most requests do not need the fields at
+# all (see api/authentication.py).
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Write-behind buffering of search history and visit records (see api/buffers.py).
+# Records are queued in memory and written in batches; when the queue is full
+# new records are dropped, and records queued in a killed process are lost.
+WRITE_BEHIND_BUFFER = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+# Precomputed "similar estates" served by estate/{pk}/similar/ (see
+# api/similarity.py), built by 'manage.py build_similar_estates' from the
+# co-visits of the last VISIT_WINDOW_DAYS days and the estates' location and
+# price. Run it with --incremental periodically to update the changed estates.
+SIMILAR_ESTATES = {
+    'NEIGHBOURS': 10,
+    'VISIT_WINDOW_DAYS': 180,
+    'MAX_ESTATES_PER_VISITOR': 100,
+    'CO_VISIT_WEIGHT': 0.7,
+}
+
+# Retention of the search history (see api/history.py). Identical consecutive
+# searches are stored once with a hit count; older rows and rows beyond the
+# per-user cap are deleted by 'manage.py compact_search_history', to be run
+# periodically (e.g. daily from cron).
+SEARCH_HISTORY = {
+    'MAX_PER_USER': 1000,
+    'MAX_AGE_DAYS': 180,
+}
+
+# Per-request SQL and timing instrumentation (see api/metrics.py). Each
+# response gets a Server-Timing header, and latency histograms per URL name
+# are served in the Prometheus format at /metrics/ to requests bearing
+# METRICS_TOKEN; without a token the route answers 404. Workers save their figures to files in METRICS_DIR; clear it
+# when the service is redeployed. Turned off, the middleware is not loaded.
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS', '0') == '1',
+    'SERVER_TIMING': True,
+    'DIR': os.environ.get('METRICS_DIR', os.path.join(gettempdir(), 'estate4rent-metrics')),
+    'FLUSH_INTERVAL': 5.0,
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
+# Table of the request throttling buckets (see api/throttling.py), a file of
+# SLOTS fixed-size entries mapped into memory by every worker of the host.
+# The rates are REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+THROTTLE = {
+    'PATH': os.environ.get('THROTTLE_FILE', os.path.join(BASE_DIR, 'var', 'throttle')),
+    'SLOTS': 65536,
+}